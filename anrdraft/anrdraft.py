@@ -1,46 +1,133 @@
 #!/usr/bin/env python
 
 
+import functools
 import json
+import logging
 import os
 import random
 import string
 import time
 
-from flask import Flask, jsonify, request
-import requests
+from flask import Flask, g, jsonify, request
 import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
 import slack
 
-from templates import blocks, templates
+import auth
+import cards
+import decklists
+import dispatch
+import dms
+import engine
+import idempotency
+import journal
+import metrics
+import render
+import scheduler
+import startup
+import store
+import tokens
+import webhooks
+import workers
+from templates import blocks
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
 
 HERE = os.path.dirname(os.path.abspath(__file__))
 
+SLACK_API_URL = slack.WebClient.BASE_URL
+
 on_heroku = os.environ.get('on_heroku')
 if on_heroku:
     API_TOKEN = os.environ.get('api_token')
     VERIFICATION_TOKEN = os.environ.get('verification_token')
+    SIGNING_SECRET = os.environ.get('signing_secret')
     SENTRY_DSN = os.environ.get('sentry_dsn')
+    STATE_STORE = os.environ.get('state_store', 'memory')
+    STATE_PATH = os.environ.get('state_path')
+    JOURNAL_PATH = os.environ.get('journal_path')
+    PICK_TIMEOUT = int(os.environ.get('pick_timeout', 0))
+    PICK_WARNING = int(os.environ.get('pick_warning', 30))
+    SLACK_API_URL = os.environ.get('slack_api_url', SLACK_API_URL)
+    PACK_VIEW = os.environ.get('pack_view', 'update')
+    ALTERNATE_PASSING = bool(int(os.environ.get('alternate_passing', 0)))
 else:
     with open(HERE + '/secrets.json', 'r') as f:
         secrets = json.loads(f.read())
         API_TOKEN = secrets['api_token']
         VERIFICATION_TOKEN = secrets['verification_token']
+        SIGNING_SECRET = secrets.get('signing_secret')
         SENTRY_DSN = secrets['sentry_dsn']
-
-sentry_sdk.init(
-    dsn=SENTRY_DSN,
-    integrations=[FlaskIntegration()]
-)
-
-client = slack.WebClient(token=API_TOKEN)
-
-DRAFTS = {}
-PLAYERS = {}
+        STATE_STORE = secrets.get('state_store', 'memory')
+        STATE_PATH = secrets.get('state_path')
+        JOURNAL_PATH = secrets.get('journal_path')
+        PICK_TIMEOUT = int(secrets.get('pick_timeout', 0))
+        PICK_WARNING = int(secrets.get('pick_warning', 30))
+        SLACK_API_URL = secrets.get('slack_api_url', SLACK_API_URL)
+        PACK_VIEW = secrets.get('pack_view', 'update')
+        ALTERNATE_PASSING = bool(secrets.get('alternate_passing', False))
+
+
+def slack_client():
+    return metrics.InstrumentedClient(
+        slack.WebClient(token=API_TOKEN, base_url=SLACK_API_URL))
+
+
+# slackclient's WebClient isn't safe to share, so each dispatcher and
+# DM-warming thread gets its own.
+client = startup.PerThread(slack_client)
+DISPATCHER = dispatch.Dispatcher(client)
+DMS = dms.DmResolver(client)
+PICK_QUEUE = workers.KeyedQueue(8, 'picks')
+# Pick tokens already queued, so Slack retries and double clicks are
+# answered without queueing the pick again.
+DELIVERIES = idempotency.DeliveryLog()
+# One pick deadline per (draft id, player) with an open pack.
+TIMERS = scheduler.TimingWheel(name='pick-timers')
+WEBHOOKS = webhooks.WebhookClient()
+# Without a signing secret, endpoints fall back to the verification token.
+VERIFIER = auth.SignatureVerifier(SIGNING_SECRET) if SIGNING_SECRET else None
+# Endpoints Slack doesn't call, and so doesn't sign.
+UNSIGNED_ENDPOINTS = {'export_metrics'}
+# (draft id, player) -> (picks, text) of the last decklist export, so
+# asking for it again before another pick doesn't render it again.
+EXPORTS = {}
+
+STORE = store.open_store(STATE_STORE, STATE_PATH)
+DRAFTS = STORE.table('drafts')
+PLAYERS = STORE.table('players')
+# creator name -> draft id, so /draft-create doesn't scan every draft
+CREATORS = STORE.table('creators')
+TABLES = {
+    'drafts': DRAFTS,
+    'players': PLAYERS,
+    'creators': CREATORS
+}
+
+# Only for the memory store, which loses everything on restart; replaying
+# it over a store that kept its state would apply every event twice.
+# Opened by start_worker(), if JOURNAL_PATH is set.
+if JOURNAL_PATH and STATE_STORE != 'memory':
+    raise ValueError('journal_path only works with the memory state store, '
+                     'not {kind}'.format(kind=STATE_STORE))
+JOURNAL = None
+
+
+def transactional(view):
+    """
+    Runs an endpoint inside a state store transaction so everything it
+    reads and changes is committed together.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with STORE.transaction():
+            response = view(*args, **kwargs)
+            maybe_snapshot()
+            return response
+    return wrapper
 
 
 # Getters
@@ -51,7 +138,19 @@ def get_player_id(player_name):
 
 
 def get_player_dm_id(player_name):
-    return PLAYERS[player_name]['dm_id']
+    """
+    Returns the player's DM channel without calling Slack, as this runs
+    inside store transactions. If the channel isn't known yet it is
+    looked up in the background and the player's user id is returned
+    meanwhile, which chat.postMessage delivers to the same DM.
+    """
+    player = PLAYERS[player_name]
+    if player['dm_id'] is None:
+        player['dm_id'] = DMS.cached(player['player_id'])
+        if player['dm_id'] is None:
+            DMS.warm(player['player_id'])
+            return player['player_id']
+    return player['dm_id']
 
 
 def get_player_draft_info(player_name):
@@ -59,10 +158,6 @@ def get_player_draft_info(player_name):
     return DRAFTS[draft_id]['players'][player_name]
 
 
-def get_seat_number(player_name):
-    return PLAYERS[player_name]['seat_number']
-
-
 def get_num_players(draft_id):
     return len(get_players(draft_id))
 
@@ -75,17 +170,12 @@ def get_creator(draft_id):
     return DRAFTS[draft_id]['metadata']['creator']
 
 
-def get_pack(draft_id, player_name, pack_num):
-    return DRAFTS[draft_id]['players'][player_name]['packs'][pack_num]
-
-
 def get_picks(draft_id, player_name):
     return DRAFTS[draft_id]['players'][player_name]['picks']
 
 
-def player_has_pack_waiting(draft_id, player_name):
-    inbox = DRAFTS[draft_id]['players'][player_name]['inbox']
-    return len(inbox) > 0
+def get_decklists(draft_id, player_name):
+    return engine.get_decklists(DRAFTS[draft_id], player_name)
 
 
 def player_has_open_pack(draft_id, player_name):
@@ -93,12 +183,7 @@ def player_has_open_pack(draft_id, player_name):
 
 
 def draft_finished(draft_id):
-    for player in get_players(draft_id):
-        inbox = DRAFTS[draft_id]['players'][player]['inbox']
-        packs = DRAFTS[draft_id]['players'][player]['packs']
-        if len(packs) > 0 or len(inbox) > 0:
-            return False
-    return True
+    return engine.draft_finished(DRAFTS[draft_id])
 
 
 def draft_started(draft_id):
@@ -106,26 +191,45 @@ def draft_started(draft_id):
 
 
 def user_can_create_draft(username):
-    for draft in DRAFTS:
-        if DRAFTS[draft]['metadata']['creator'] == username:
-            return False
-    return True
+    return username not in CREATORS
+
+
+def check_indexes():
+    """
+    Compares CREATORS and each draft's player list against PLAYERS and
+    returns a description of every mismatch. Walks all state, so it is
+    only meant for /debug and tests/test_indexes.py.
+    """
+    problems = []
+    for draft_id in DRAFTS:
+        creator = get_creator(draft_id)
+        if CREATORS.get(creator) != draft_id:
+            problems.append('{draft}: creator {creator} not indexed'.format(
+                draft=draft_id, creator=creator))
+        for player in get_players(draft_id):
+            if PLAYERS.get(player, {}).get('draft_id') != draft_id:
+                problems.append('{draft}: player {player} not indexed'.format(
+                    draft=draft_id, player=player))
+    for creator, draft_id in CREATORS.items():
+        if draft_id not in DRAFTS or get_creator(draft_id) != creator:
+            problems.append('creator {creator} points at {draft}'.format(
+                creator=creator, draft=draft_id))
+    for player, info in PLAYERS.items():
+        draft_id = info['draft_id']
+        if draft_id not in DRAFTS or player not in get_players(draft_id):
+            problems.append('player {player} points at {draft}'.format(
+                player=player, draft=draft_id))
+    return problems
 
 
 # Draft Setup
 
-def setup_draft(initiating_user_name, initiating_user_id):
-    draft_id = gen_draft_id()
-    while draft_id in DRAFTS:
+def setup_draft(initiating_user_name, initiating_user_id, draft_id=None):
+    while draft_id is None or draft_id in DRAFTS:
         draft_id = gen_draft_id()
-    DRAFTS[draft_id] = {
-        'metadata': {
-            'creator': initiating_user_name,
-            'has_started': False,
-            'stage': 0
-        },
-        'players': {}
-    }
+    DRAFTS[draft_id] = engine.new_draft(
+        initiating_user_name, alternate_passing=ALTERNATE_PASSING)
+    CREATORS[initiating_user_name] = draft_id
     add_player(initiating_user_name, initiating_user_id, draft_id)
     return draft_id
 
@@ -140,88 +244,19 @@ def gen_draft_id():
     return code
 
 
-def deal_card(draft_id, player_name, pack_num, card):
-    DRAFTS[draft_id]["players"][player_name]['packs'][pack_num].append(
-        card)
-
-
-def read_cards_from_file(filepath):
-    with open(filepath, 'r') as f:
-        cards = json.loads(f.read())['cards']
-        return cards
-
-
-def setup_packs(draft_id):
-    num_players = get_num_players(draft_id)
-    total_ids = num_players * 5
-    card_total = num_players * 15 * 3
-
-    data_dir = HERE + '/data'
-    corp_ids = read_cards_from_file(data_dir + '/corp_ids.json')
-    random.shuffle(corp_ids)
-    corp_ids = corp_ids[:total_ids]
-    corp_cards = read_cards_from_file(data_dir + '/corp_cards.json')
-    random.shuffle(corp_cards)
-    corp_cards = corp_cards[:card_total]
-    runner_ids = read_cards_from_file(data_dir + '/runner_ids.json')
-    random.shuffle(runner_ids)
-    runner_ids = runner_ids[:total_ids]
-    runner_cards = read_cards_from_file(data_dir + '/runner_cards.json')
-    random.shuffle(runner_cards)
-    runner_cards = runner_cards[:card_total]
-
-    pack_num = 0
-    cards_per_pack = len(corp_cards) // (get_num_players(draft_id) * 3)
-    while len(corp_ids) >= get_num_players(draft_id):
-        for player in get_players(draft_id):
-            card_index = random.randint(0, len(corp_ids) - 1)
-            card = corp_ids.pop(card_index)
-            deal_card(draft_id, player, pack_num, card)
-    pack_num += 1
-
-    while corp_cards and pack_num <= 3:
-        for player in get_players(draft_id):
-            card_index = random.randint(0, len(corp_cards) - 1)
-            card = corp_cards.pop(card_index)
-            deal_card(draft_id, player, pack_num, card)
-        if len(get_pack(draft_id, player, pack_num)) == cards_per_pack:
-            pack_num += 1
-
-    while len(runner_ids) >= get_num_players(draft_id):
-        for player in get_players(draft_id):
-            card_index = random.randint(0, len(runner_ids) - 1)
-            card = runner_ids.pop(card_index)
-            deal_card(draft_id, player, pack_num, card)
-    pack_num += 1
-
-    while len(runner_cards) >= get_num_players(draft_id):
-        for player in get_players(draft_id):
-            card_index = random.randint(0, len(runner_cards) - 1)
-            card = runner_cards.pop(card_index)
-            deal_card(draft_id, player, pack_num, card)
-        if len(get_pack(draft_id, player, pack_num)) == cards_per_pack:
-            pack_num += 1
+def setup_packs(draft_id, seed=None):
+    engine.deal(DRAFTS[draft_id], seed)
 
 
 def add_player(player_name, player_id, draft_id):
-    im_list = client.im_list()
-    for im in im_list['ims']:
-        if im['user'] == player_id:
-            player_dm_id = im['id']
-
-    DRAFTS[draft_id]['players'][player_name] = {
-        'inbox': [],
-        'packs': [[], [], [], [], [], [], [], []],
-        'picks': {
-            'corp': [],
-            'runner': []
-        },
-        'has_open_pack': False
-    }
+    # The DM channel is resolved in the background and looked up again by
+    # get_player_dm_id when it is first needed.
+    DMS.warm(player_id)
+    DRAFTS[draft_id]['players'][player_name] = engine.new_player()
     PLAYERS[player_name] = {
         'player_id': player_id,
         'draft_id': draft_id,
-        'dm_id': player_dm_id
+        'dm_id': DMS.cached(player_id)
     }
 
     return 'ADD_SUCCESSFUL'
@@ -235,188 +270,518 @@ def remove_player(player_name, draft_id):
     if player_name not in get_players(draft_id):
         return 'You were not registered for `{draft_id}`.'.format(draft_id=draft_id)
     del DRAFTS[draft_id]['players'][player_name]
+    if PLAYERS.get(player_name, {}).get('draft_id') == draft_id:
+        del PLAYERS[player_name]
     return 'ok'
 
 
-def assign_seat_numbers(draft_id):
-    num_players = get_num_players(draft_id)
-    seats = list(range(num_players))
-    random.shuffle(seats)
-    for player in get_players(draft_id):
-        PLAYERS[player]['seat_number'] = seats.pop(0)
+def assign_seat_numbers(draft_id, seats=None):
+    engine.assign_seats(DRAFTS[draft_id], seats)
+
+
+def begin_draft(draft_id, seed=None, seats=None):
+    setup_packs(draft_id, seed)
+    assign_seat_numbers(draft_id, seats)
+    DRAFTS[draft_id]['metadata']['has_started'] = True
+    open_new_pack(draft_id)
 
 
 # Draft Operations
+#
+# These only change state, through engine.py, and arm or cancel pick
+# timers to match. Messages are built from the resulting state by the
+# callers, so the journal can replay them after a restart.
 
 def open_new_pack(draft_id):
-    """
-    Sends first set of picks to players.
-    After this the pack-sending logic is entirely event-driven.
-    """
+    engine.open_new_pack(DRAFTS[draft_id])
     for player in get_players(draft_id):
-        pack = DRAFTS[draft_id]['players'][player]['packs'].pop(0)
-        DRAFTS[draft_id]['players'][player]['inbox'].append(pack)
-        card_blocks = [blocks.divider()]
-        for card in pack:
-            card_text = templates.format(card)
-            button_value = '--'.join([draft_id, player, card['code']])
-            pick_block = blocks.text_with_button(
-                card_text, card['title'], button_value)
-            card_blocks.append(pick_block)
-            card_blocks.append(blocks.divider())
-        client.chat_postMessage(
-            channel=get_player_dm_id(player),
-            blocks=card_blocks
-        )
-        DRAFTS[draft_id]['players'][player]['has_open_pack'] = True
+        arm_pick_timer(draft_id, player)
+
 
+def pack_blocks(draft_id, player):
+    player_info = DRAFTS[draft_id]['players'][player]
+    pack = player_info['inbox'][0]
+    card_blocks = [blocks.divider()]
+    for slot, card_id in enumerate(pack):
+        button_value = tokens.encode(
+            draft_id, player, player_info['generation'], slot)
+        card_blocks.append(render.pick_block(
+            cards.get_card_by_id(card_id), button_value))
+        card_blocks.append(blocks.divider())
+    return card_blocks
 
-def handle_pick(actions):
+
+def handle_pick(actions, pack_message=None):
+    """
+    Applies the picks in `actions` and returns (draft id, player, card)
+    for the last one accepted, or None. Stale, replayed or malformed pick
+    tokens are ignored.
+
+    `pack_message` is the [channel, ts] of the message the pick was made
+    from, which later packs are shown in when PACK_VIEW is 'update'.
+    """
+    picked = None
     for action in actions:
-        encoded_value = action['value']
-        draft_id, player_name, card_code = encoded_value.split('--')
-        pack = DRAFTS[draft_id]['players'][player_name]['inbox'].pop(0)
-        for i, card in enumerate(pack):
-            if card['code'] == card_code:
-                card_index = i
-                break
-        picked_card = pack.pop(card_index)
-        add_card_to_picks(draft_id, player_name, picked_card)
-        DRAFTS[draft_id]['players'][player_name]['has_open_pack'] = False
-        if len(pack) > 0:
-            pass_pack(draft_id, player_name, pack)
-
-
-def add_card_to_picks(draft_id, player_name, picked_card):
-    draft = DRAFTS[draft_id]
-    player = draft['players'][player_name]
-    player_picks = player['picks'][picked_card['side_code']]
-    player_picks.append(picked_card['title'])
-
-
-def pass_pack(draft_id, player_name, pack):
-    player_seat = get_seat_number(player_name)
-    next_seat = (player_seat + 1) % get_num_players(draft_id)
-    for player in get_players(draft_id):
-        if get_seat_number(player) == next_seat:
-            DRAFTS[draft_id]['players'][player]['inbox'].append(pack)
+        token = tokens.decode(action['value'])
+        if token is None:
+            continue
+        draft_id, player_name, generation, slot = token
+        if draft_id not in DRAFTS:
+            continue
+        player_info = DRAFTS[draft_id]['players'].get(player_name)
+        if (player_info is None
+                or not player_info['has_open_pack']
+                or player_info['generation'] != generation):
+            continue
+        if slot >= len(player_info['inbox'][0]):
+            continue
+        picked_card = take_pick(draft_id, player_name, slot, pack_message)
+        picked = (draft_id, player_name, picked_card)
+    return picked
 
 
-def open_next_pack(draft_id, player):
-    pack = DRAFTS[draft_id]['players'][player]['inbox'][0]
-    card_blocks = [blocks.divider()]
-    for card in pack:
-        card_text = templates.format(card)
-        # TODO: maybe encode list index so we don't have to iterate to pick the card.
-        button_value = '--'.join([draft_id, player, card['code']])
-        pick_block = blocks.text_with_button(
-            card_text, card['title'], button_value)
-        card_blocks.append(pick_block)
-        card_blocks.append(blocks.divider())
-    client.chat_postMessage(
-        channel=get_player_dm_id(player),
-        text='Here is your next pack.'
-    )
-    client.chat_postMessage(
-        channel=get_player_dm_id(player),
-        blocks=card_blocks
-    )
-    DRAFTS[draft_id]['players'][player]['has_open_pack'] = True
+def take_pick(draft_id, player_name, slot, pack_message=None):
+    if pack_message:
+        DRAFTS[draft_id]['players'][player_name]['pack_message'] = pack_message
+    picked_card = apply_pick(draft_id, player_name, slot)
+    record('pick', draft_id, player_name, slot, pack_message)
+    return picked_card
+
+
+def apply_pick(draft_id, player_name, slot):
+    cancel_pick_timer(draft_id, player_name)
+    return engine.apply_pick(DRAFTS[draft_id], player_name, slot)
+
+
+def advance_draft(draft_id):
+    """
+    engine.advance, then arms the pick timers of the players who got a
+    pack, or of everyone when a new round started.
+    """
+    opened, new_round = engine.advance(DRAFTS[draft_id])
+    for player in get_players(draft_id) if new_round else opened:
+        arm_pick_timer(draft_id, player)
+    return opened, new_round
 
 
-def open_next_pack_or_wait(payload):
+def player_message(draft_id, player, **content):
+    """
+    Returns the arguments for a message to `player`. When PACK_VIEW is
+    'update' and we know which message shows the player's pack, it is
+    edited in place rather than posting a new one. Otherwise the new
+    message becomes the one shown to the player from then on.
+    """
+    pack_message = DRAFTS[draft_id]['players'][player].get('pack_message')
+    if PACK_VIEW == 'update' and pack_message:
+        content['channel'], content['ts'] = pack_message
+    else:
+        content['channel'] = get_player_dm_id(player)
+        if PACK_VIEW == 'update':
+            content['on_sent'] = functools.partial(
+                remember_pack_message, draft_id, player)
+    return content
+
+
+def remember_pack_message(draft_id, player, response):
+    """
+    Keeps the channel and ts of a newly posted pack message, so later
+    packs are shown in it even before the player has clicked anything.
+    Called on a dispatcher thread once Slack answers.
+    """
+    pack_message = [response['channel'], response['ts']]
+    with STORE.transaction():
+        if draft_id not in DRAFTS:
+            return
+        player_info = DRAFTS[draft_id]['players'].get(player)
+        if player_info is None:
+            return
+        player_info['pack_message'] = pack_message
+        record('pack_message', draft_id, player, pack_message)
+        maybe_snapshot()
+
+
+def pack_messages(draft_id, player, text=None):
+    if PACK_VIEW == 'update':
+        card_blocks = pack_blocks(draft_id, player)
+        if text:
+            card_blocks.insert(0, blocks.card_text(text))
+        return [player_message(
+            draft_id, player,
+            text=text or 'Here is your next pack.',
+            blocks=card_blocks
+        )]
+    channel = get_player_dm_id(player)
+    messages = []
+    if text:
+        messages.append({'channel': channel, 'text': text})
+    messages.append({
+        'channel': channel,
+        'blocks': pack_blocks(draft_id, player)
+    })
+    return messages
+
+
+def waiting_message(draft_id, player, picked_card):
+    text = (picked_card.title
+            + ' was picked. A new pack will open once it is passed to you.')
+    return player_message(
+        draft_id, player, text=text, blocks=[blocks.card_text(text)])
+
+
+def get_pack_message_ref(payload):
+    container = payload.get('container') or {}
+    channel = (container.get('channel_id')
+               or (payload.get('channel') or {}).get('id'))
+    ts = container.get('message_ts')
+    if channel and ts:
+        return [channel, ts]
+
+
+def process_pick(payload):
+    """
+    Applies a pick and sends the follow-up messages. Runs on PICK_QUEUE,
+    which keeps picks for the same draft in order.
+    """
+    with metrics.PICK_SECONDS.time(), STORE.transaction():
+        picked = handle_pick(
+            payload['actions'], get_pack_message_ref(payload))
+        if picked is None:
+            return
+        open_next_pack_or_wait(*picked)
+        maybe_snapshot()
+    if PACK_VIEW != 'update':
+        acknowledge_pick(payload)
+
+
+def acknowledge_pick(payload):
     card_name = ' '.join(payload['actions'][0]['text']['text'].split(' ')[1:])
     request = {
         'text': card_name + ' was picked. A new pack will open once it is passed to you.',
         "replace_original": True
     }
-    requests.post(payload['response_url'], json=request)
-    need_new_pack = True
-    for action in payload['actions']:
-        draft_id, _, _ = action['value'].split('--')
+    WEBHOOKS.post_async(payload['response_url'], request)
+
+
+def open_next_pack_or_wait(draft_id, picker=None, picked_card=None):
+    """
+    Opens the packs the last pick freed up and queues the messages. With
+    PACK_VIEW 'update', `picker` sees a waiting note in place of the pack
+    they picked from unless a new pack opened for them straight away.
+    """
+    opened, new_round = advance_draft(draft_id)
+    finished = draft_finished(draft_id)
+    messages = []
+    for player in opened:
+        messages.extend(
+            pack_messages(draft_id, player, 'Here is your next pack.'))
+    if new_round:
         for player in get_players(draft_id):
-            if player_has_pack_waiting(draft_id, player):
-                need_new_pack = False
-                if not player_has_open_pack(draft_id, player):
-                    open_next_pack(draft_id, player)
-    if need_new_pack:
-        if draft_finished(draft_id):
-            for player in get_players(draft_id):
-                client.chat_postMessage(
-                    channel=get_player_dm_id(player),
-                    text='The draft is complete! Here are your picks:'
-                )
-                picks = get_picks(draft_id, player)
-                client.chat_postMessage(
-                    channel=get_player_dm_id(player),
-                    text=format_picks('Corp:\n', picks['corp'])
-                )
-                client.chat_postMessage(
-                    channel=get_player_dm_id(player),
-                    text=format_picks('Runner:\n', picks['runner'])
-                )
-            cleanup(draft_id)
-        else:
-            open_new_pack(draft_id)
+            messages.extend(pack_messages(draft_id, player))
+    elif (PACK_VIEW == 'update' and picker is not None
+            and picker not in opened and not finished):
+        messages.append(waiting_message(draft_id, picker, picked_card))
+    if finished:
+        for player in get_players(draft_id):
+            done = 'The draft is complete! Here are your picks:'
+            messages.append(player_message(
+                draft_id, player, text=done,
+                blocks=[blocks.card_text(done)]))
+            messages.append(picks_message(draft_id, player))
+        cleanup(draft_id)
+        metrics.DRAFTS_COMPLETED.inc()
+    DISPATCHER.post_messages(messages)
+
+
+# Pick Timers
+#
+# With PICK_TIMEOUT set, a player who hasn't picked from an open pack in
+# time is warned PICK_WARNING seconds before the deadline and then has a
+# card picked for them, so one slow player can't stall the pod. Timers
+# live in memory only; after a restart they are armed again as the
+# journal replays packs being opened.
+
+def arm_pick_timer(draft_id, player):
+    if not PICK_TIMEOUT:
+        return
+    generation = DRAFTS[draft_id]['players'][player]['generation']
+    if 0 < PICK_WARNING < PICK_TIMEOUT:
+        TIMERS.schedule((draft_id, player), PICK_TIMEOUT - PICK_WARNING,
+                        PICK_QUEUE.submit, draft_id, warn_player,
+                        draft_id, player, generation)
+    else:
+        TIMERS.schedule((draft_id, player), PICK_TIMEOUT,
+                        PICK_QUEUE.submit, draft_id, auto_pick,
+                        draft_id, player, generation)
+
+
+def cancel_pick_timer(draft_id, player):
+    TIMERS.cancel((draft_id, player))
+
+
+def pick_is_pending(draft_id, player, generation):
+    if draft_id not in DRAFTS:
+        return False
+    player_info = DRAFTS[draft_id]['players'].get(player)
+    return (player_info is not None
+            and player_info['has_open_pack']
+            and player_info['generation'] == generation)
+
+
+def warn_player(draft_id, player, generation):
+    with STORE.transaction():
+        if not pick_is_pending(draft_id, player, generation):
+            return
+        TIMERS.schedule((draft_id, player), PICK_WARNING,
+                        PICK_QUEUE.submit, draft_id, auto_pick,
+                        draft_id, player, generation)
+        channel = get_player_dm_id(player)
+    DISPATCHER.post_messages([{
+        'channel': channel,
+        'text': ('{seconds} seconds left to pick! A card will be picked '
+                 'for you when time runs out.').format(seconds=PICK_WARNING)
+    }])
+
+
+def auto_pick(draft_id, player, generation):
+    """
+    Picks a random card from the player's open pack once their time is
+    up. Runs on PICK_QUEUE like any other pick.
+    """
+    with metrics.PICK_SECONDS.time(), STORE.transaction():
+        if not pick_is_pending(draft_id, player, generation):
+            return
+        pack = DRAFTS[draft_id]['players'][player]['inbox'][0]
+        picked_card = take_pick(draft_id, player, random.randrange(len(pack)))
+        metrics.AUTO_PICKS.inc()
+        DISPATCHER.post_messages([{
+            'channel': get_player_dm_id(player),
+            'text': 'Time ran out, so {title} was picked for you.'.format(
+                title=picked_card.title)
+        }])
+        open_next_pack_or_wait(draft_id, player, picked_card)
+        maybe_snapshot()
 
 
 def cleanup(draft_id):
-    del DRAFTS[draft_id]
-    # make a copy for iteration so you can delete from the real one
-    for player in list(PLAYERS.keys()):
-        if PLAYERS[player]['draft_id'] == draft_id:
+    creator = get_creator(draft_id)
+    if CREATORS.get(creator) == draft_id:
+        del CREATORS[creator]
+    for player in get_players(draft_id):
+        cancel_pick_timer(draft_id, player)
+        EXPORTS.pop((draft_id, player), None)
+        if PLAYERS.get(player, {}).get('draft_id') == draft_id:
             del PLAYERS[player]
+    del DRAFTS[draft_id]
 
 
-def format_picks(heading, picks):
-    picks_copy = picks[:]
-    for i, card in enumerate(picks_copy):
-        if i < 5 or 49 < i < 53:
-            pre = '1 '
-        else:
-            pre = '3 '
-        picks_copy[i] = pre + card
-    cards = '\n'.join(picks_copy)
-    return '```' + heading + '\n' + cards + '```'
+def get_picks_export(draft_id, player):
+    """
+    Returns the player's picks as a decklist, rendered again only
+    when they have picked since it was last asked for.
+    """
+    decklist = get_decklists(draft_id, player)
+    picked = sum(decklist[side]['total'] for side in decklists.SIDES)
+    cached = EXPORTS.get((draft_id, player))
+    if cached is None or cached[0] != picked:
+        cached = EXPORTS[(draft_id, player)] = (
+            picked, decklists.export(decklist))
+    return cached[1]
+
+
+def picks_message(draft_id, player, text=''):
+    """
+    Returns the arguments for one message with the player's picks in a
+    code block, ready to paste into a deckbuilder.
+    """
+    return {
+        'channel': get_player_dm_id(player),
+        'text': text + '```' + get_picks_export(draft_id, player) + '```'
+    }
+
+
+# Journal / Recovery
+
+def record(*event):
+    """
+    Appends an event to the journal, if there is one. Called inside the
+    transaction that made the change so events are logged in the order
+    they were applied.
+    """
+    if JOURNAL is not None:
+        JOURNAL.append(event)
+
+
+def maybe_snapshot():
+    """
+    Snapshots the state once enough events have been logged. Called at
+    the end of a transaction, never between an event being recorded and
+    the rest of its operation, so the snapshot can't hold half a pick.
+    """
+    if JOURNAL is not None and JOURNAL.needs_snapshot():
+        JOURNAL.snapshot(snapshot_state())
+
+
+def snapshot_state():
+    return {name: dict(table) for name, table in TABLES.items()}
+
+
+def replay(event):
+    kind, draft_id, args = event[0], event[1], event[2:]
+    if kind == 'create':
+        if draft_id in DRAFTS:
+            raise ValueError('Draft {draft_id} already exists.'.format(
+                draft_id=draft_id))
+        setup_draft(args[0], args[1], draft_id)
+    elif kind == 'join':
+        add_player(args[0], args[1], draft_id)
+    elif kind == 'leave':
+        remove_player(args[0], draft_id)
+    elif kind == 'cancel':
+        cleanup(draft_id)
+    elif kind == 'start':
+        begin_draft(draft_id, args[0], args[1])
+    elif kind == 'pack_message':
+        if draft_id in DRAFTS and args[0] in DRAFTS[draft_id]['players']:
+            DRAFTS[draft_id]['players'][args[0]]['pack_message'] = args[1]
+    elif kind == 'pick':
+        if len(args) > 2 and args[2]:
+            DRAFTS[draft_id]['players'][args[0]]['pack_message'] = args[2]
+        apply_pick(draft_id, args[0], args[1])
+        advance_draft(draft_id)
+        if draft_finished(draft_id):
+            cleanup(draft_id)
+    else:
+        logger.warning('Unknown journal event %r', event)
+
+
+def recover():
+    """
+    Rebuilds state from the last snapshot and the journal after a
+    restart, then re-sends every player their open pack in the
+    background.
+    """
+    snapshot, snapshot_seq, events = JOURNAL.load()
+    with STORE.transaction():
+        for name, records in (snapshot or {}).items():
+            TABLES[name].update(records)
+        for seq, event in events:
+            if seq is not None and seq <= snapshot_seq:
+                # Left in the log by a crash while taking the snapshot.
+                continue
+            try:
+                replay(event)
+            except Exception:
+                logger.exception('Could not replay %r', event)
+        JOURNAL.snapshot(snapshot_state())
+        started = [draft_id for draft_id in DRAFTS if draft_started(draft_id)]
+    for draft_id in started:
+        PICK_QUEUE.submit(draft_id, redeliver_packs, draft_id)
+
+
+def redeliver_packs(draft_id):
+    with STORE.transaction():
+        if draft_id not in DRAFTS:
+            return
+        messages = []
+        for player in get_players(draft_id):
+            if player_has_open_pack(draft_id, player):
+                messages.extend(pack_messages(
+                    draft_id, player,
+                    'The draft was restarted. Here is your current pack.'
+                ))
+    DISPATCHER.post_messages(messages)
 
 
 # Endpoints / Slash Commands
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.before_request
+def ensure_worker_started():
+    start_worker()
+
+
+@app.before_request
+def verify_signature():
+    if VERIFIER is None or request.endpoint in UNSIGNED_ENDPOINTS:
+        return None
+    reason = VERIFIER.check_request(request)
+    if reason is not None:
+        metrics.AUTH_REJECTED.inc(reason=reason)
+        return 'Invalid request signature.', 401
+    return None
+
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.REQUEST_SECONDS.observe(
+            elapsed,
+            endpoint=request.url_rule.rule if request.url_rule else 'unknown',
+            status=response.status_code
+        )
+        startup.TIMINGS.setdefault('first_request', elapsed)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    return metrics.render(), 200, {
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'
+    }
+
+
 @app.route('/actions', methods=['POST'])
 def actions():
     payload = json.loads(request.form['payload'])
 
     request_token = payload['token']
-    if request_token == VERIFICATION_TOKEN:
-        actions = payload['actions']
-        handle_pick(actions)
-        open_next_pack_or_wait(payload)
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
+        token = tokens.decode(payload['actions'][0]['value'])
+        if token is not None:
+            retry_num = request.headers.get('X-Slack-Retry-Num')
+            if DELIVERIES.accept(token, retry_num):
+                PICK_QUEUE.submit(token[0], process_pick, payload)
+            else:
+                metrics.DUPLICATE_ACTIONS.inc(
+                    reason=request.headers.get('X-Slack-Retry-Reason', 'none'))
         return jsonify({'success': True})
 
 
 @app.route('/debug', methods=['POST'])
+@transactional
 def debug():
     request_token = request.form['token']
-    if request_token == VERIFICATION_TOKEN:
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
         if request.form['user_name'] == 'weston.odom':
             with open('debug.log', 'w') as f:
                 f.write(json.dumps({
                     'dumped_at': time.strftime("%Y-%m-%d %H:%M"),
-                    'PLAYERS': PLAYERS,
-                    'DRAFTS': DRAFTS
-                }, indent=4, sort_keys=True))
+                    'PLAYERS': dict(PLAYERS),
+                    'DRAFTS': dict(DRAFTS),
+                    'CREATORS': dict(CREATORS),
+                    'index_problems': check_indexes(),
+                    'startup': startup.TIMINGS
+                }, indent=4, sort_keys=True, default=store.json_default))
             return 'Dump successful.'
         return 'Only an admin can use this command.'
 
 
 @app.route('/draft-create', methods=['POST'])
+@transactional
 def create_draft():
     request_token = request.form['token']
-    if request_token == VERIFICATION_TOKEN:
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
         user_name = request.form['user_name']
         if user_can_create_draft(user_name):
             user_id = request.form['user_id']
             new_draft_code = setup_draft(user_name, user_id)
+            record('create', new_draft_code, user_name, user_id)
             return (
                 'Draft successfully created. Your draft ID is `{draft_id}`. '
                 'Other players can use this code with the `/draft-join` '
@@ -430,9 +795,10 @@ def create_draft():
 
 
 @app.route('/draft-cancel', methods=['POST'])
+@transactional
 def cancel_draft():
     request_token = request.form['token']
-    if request_token == VERIFICATION_TOKEN:
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
         user_name = request.form['user_name']
         draft_id = request.form['text']
         if draft_id[0] == draft_id[-1] == '`':
@@ -450,24 +816,23 @@ def cancel_draft():
 
 
 def _cancel_draft(draft_id):
-    for player in get_players(draft_id):
-        client.chat_postMessage(
-            channel=get_player_dm_id(player),
-            text=(
-                'Draft `{draft_id}` was cancelled by '
-                '`{creator}`.'.format(
-                    draft_id=draft_id,
-                    creator=get_creator(draft_id)
-                )
-            )
-        )
+    text = 'Draft `{draft_id}` was cancelled by `{creator}`.'.format(
+        draft_id=draft_id,
+        creator=get_creator(draft_id)
+    )
+    DISPATCHER.post_messages([
+        {'channel': get_player_dm_id(player), 'text': text}
+        for player in get_players(draft_id)
+    ])
     cleanup(draft_id)
+    record('cancel', draft_id)
 
 
 @app.route('/draft-start', methods=['POST'])
+@transactional
 def start_draft():
     request_token = request.form['token']
-    if request_token == VERIFICATION_TOKEN:
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
         draft_id = request.form['text']
         if draft_id[0] == draft_id[-1] == '`':
             draft_id = draft_id[1:-1]
@@ -480,22 +845,24 @@ def start_draft():
             return 'Draft `{draft_id}` has already started.'.format(
                 draft_id=draft_id
             )
-        setup_packs(draft_id)
-        assign_seat_numbers(draft_id)
-        DRAFTS[draft_id]['metadata']['has_started'] = True
+        begin_draft(draft_id)
+        record('start', draft_id, DRAFTS[draft_id]['metadata']['seed'],
+               DRAFTS[draft_id]['seats'])
+        messages = []
         for player in get_players(draft_id):
-            client.chat_postMessage(
-                channel=get_player_dm_id(player),
-                text='Welcome to the draft! Here is your first pack. Good luck!'
-            )
-        open_new_pack(draft_id)
+            messages.extend(pack_messages(
+                draft_id, player,
+                'Welcome to the draft! Here is your first pack. Good luck!'
+            ))
+        DISPATCHER.post_messages(messages)
         return '', 200
 
 
 @app.route('/draft-join', methods=['POST'])
+@transactional
 def join_draft():
     request_token = request.form['token']
-    if request_token == VERIFICATION_TOKEN:
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
         draft_id = request.form['text']
         if draft_id[0] == draft_id[-1] == '`':
             draft_id = draft_id[1:-1]
@@ -510,17 +877,18 @@ def join_draft():
             )
         player_id = request.form['user_id']
         add_player(player_name, player_id, draft_id)
+        record('join', draft_id, player_name, player_id)
         creator_name = get_creator(draft_id)
         player_dm_channel = get_player_dm_id(creator_name)
         num_players = get_num_players(draft_id)
-        client.chat_postMessage(
-            channel=player_dm_channel,
-            text=(
+        DISPATCHER.post_messages([{
+            'channel': player_dm_channel,
+            'text': (
                 '{player} has joined your draft (`{draft}`). There are now '
                 '{num} players registered.').format(
                     player=player_name, draft=draft_id, num=num_players
             )
-        )
+        }])
     return (
         'Successfully joined draft `{draft_id}`. Please wait for `{creator}` '
         'to begin the draft.'
@@ -528,9 +896,10 @@ def join_draft():
 
 
 @app.route('/draft-leave', methods=['POST'])
+@transactional
 def leave_draft():
     request_token = request.form['token']
-    if request_token == VERIFICATION_TOKEN:
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
         draft_id = request.form['text']
         if draft_id[0] == draft_id[-1] == '`':
             draft_id = draft_id[1:-1]
@@ -539,6 +908,7 @@ def leave_draft():
         res = remove_player(player_name, draft_id)
         if res != 'ok':
             return 'Failed to leave draft. Error: ' + res
+        record('leave', draft_id, player_name)
         if player_name == get_creator(draft_id):
             _cancel_draft(draft_id)
             return (
@@ -549,43 +919,54 @@ def leave_draft():
         creator_name = get_creator(draft_id)
         player_dm_channel = get_player_dm_id(creator_name)
         num_players = get_num_players(draft_id)
-        client.chat_postMessage(
-            channel=player_dm_channel,
-            text=(
+        DISPATCHER.post_messages([{
+            'channel': player_dm_channel,
+            'text': (
                 '{player} has left your draft (`{draft}`). There are now '
                 '{num} players registered.').format(
                     player=player_name, draft=draft_id, num=num_players
             )
-        )
+        }])
     return (
         'Successfully withdrew from draft `{draft_id}`.'
     ).format(draft_id=draft_id, creator=creator_name)
 
 
 @app.route('/draft-picks', methods=['POST'])
+@transactional
 def picks():
     request_token = request.form['token']
-    if request_token == VERIFICATION_TOKEN:
+    if auth.token_matches(request_token, VERIFICATION_TOKEN):
         player_name = request.form['user_name']
         # remove_player() does the checks I usually do here
         if player_name not in PLAYERS:
             return 'You are not enrolled in a draft.'
         draft_id = PLAYERS[player_name]['draft_id']
-        client.chat_postMessage(
-            channel=get_player_dm_id(player_name),
-            text='Here are your picks so far:'
-        )
-        picks = get_picks(draft_id, player_name)
-        client.chat_postMessage(
-            channel=get_player_dm_id(player_name),
-            text=format_picks('Corp:\n\n', picks['corp'])
-        )
-        client.chat_postMessage(
-            channel=get_player_dm_id(player_name),
-            text=format_picks('Runner:\n\n', picks['runner'])
-        )
+        DISPATCHER.post_messages([picks_message(
+            draft_id, player_name, 'Here are your picks so far:\n')])
     return '', 200
 
 
+# Worker Startup
+
+@startup.Once
+def start_worker():
+    """
+    Sets up what each worker process needs for itself: Sentry, and the
+    journal's file and fsync thread, replaying the journal first. Called
+    by gunicorn's post_fork hook, or else by the first request.
+    """
+    global JOURNAL
+    if SENTRY_DSN:
+        sentry_sdk.init(
+            dsn=SENTRY_DSN,
+            integrations=[FlaskIntegration()]
+        )
+    if JOURNAL_PATH:
+        JOURNAL = journal.Journal(JOURNAL_PATH)
+        recover()
+
+
 if __name__ == '__main__':
+    start_worker()
     app.run()
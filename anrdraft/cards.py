@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import random
+from types import MappingProxyType
+
+import catalog
+
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+POOL_NAMES = ('corp_ids', 'corp_cards', 'runner_ids', 'runner_cards')
+
+COMPILED_NAME = 'cards.bin'
+
+
+class Card:
+    """
+    A catalog entry. `id` is its position in the catalog, which is what
+    drafts store in packs and picks. Fields are read from the catalog as
+    they are asked for, as attributes or with `get` and `[]`, which
+    behave like they would on the raw dict.
+    """
+
+    __slots__ = ('id', '_catalog')
+
+    def __init__(self, card_id, source):
+        self.id = card_id
+        self._catalog = source
+
+    def get(self, name, default=None):
+        try:
+            return self._catalog.value(self.id, name)
+        except KeyError:
+            return default
+
+    def __getitem__(self, name):
+        return self._catalog.value(self.id, name)
+
+    def __contains__(self, name):
+        return self.get(name, _MISSING) is not _MISSING
+
+    def keys(self):
+        return [name for name in self._catalog.fields if name in self]
+
+    def __repr__(self):
+        return '<Card {id} {code} {title!r}>'.format(
+            id=self.id, code=self.get('code'), title=self.get('title'))
+
+
+_MISSING = object()
+
+
+def _field(name):
+    def read(card):
+        try:
+            return card._catalog.value(card.id, name)
+        except KeyError:
+            raise AttributeError(name) from None
+    return property(read)
+
+
+# Card.title and friends, as properties so reading them doesn't go
+# through a failed attribute lookup first.
+for _name, _ in catalog.FIELDS:
+    setattr(Card, _name, _field(_name))
+
+
+def read_cards_from_file(filepath):
+    with open(filepath, 'r') as f:
+        cards = json.loads(f.read())['cards']
+        return cards
+
+
+def compile_catalog(data_dir=DATA_DIR):
+    return catalog.build([
+        (name, read_cards_from_file(os.path.join(data_dir, name + '.json')))
+        for name in POOL_NAMES
+    ])
+
+
+def _compiled_is_current(data_dir):
+    path = os.path.join(data_dir, COMPILED_NAME)
+    if not os.path.exists(path):
+        return False
+    built_at = os.path.getmtime(path)
+    return all(
+        os.path.getmtime(os.path.join(data_dir, name + '.json')) <= built_at
+        for name in POOL_NAMES)
+
+
+def load_catalog(data_dir=DATA_DIR):
+    """
+    Opens the compiled catalog in `data_dir` if it is newer than the card
+    files, and otherwise compiles them in memory. Returns the catalog and
+    the pools and list of cards over it.
+
+    The compiled file is mapped read-only, so every worker on the machine
+    shares one copy and loading takes about the same time however many
+    cards there are. Card ids follow the order of the files, so they
+    only stay stable while the data files do.
+    """
+    compiled = None
+    if _compiled_is_current(data_dir):
+        try:
+            compiled = catalog.Catalog.open(
+                os.path.join(data_dir, COMPILED_NAME))
+        except (OSError, ValueError):
+            logger.warning('Could not open %s, reading the card files.',
+                           COMPILED_NAME, exc_info=True)
+    if compiled is None:
+        compiled = catalog.Catalog(compile_catalog(data_dir))
+    all_cards = tuple(Card(card_id, compiled)
+                      for card_id in range(len(compiled)))
+    pools = {name: all_cards[first:first + count]
+             for name, (first, count) in compiled.pools.items()}
+    return compiled, MappingProxyType(pools), all_cards
+
+
+CATALOG, POOLS, ALL_CARDS = load_catalog()
+
+
+def get_card(code):
+    card_id = CATALOG.find(code)
+    if card_id is None:
+        raise KeyError(code)
+    return ALL_CARDS[card_id]
+
+
+def get_card_by_id(card_id):
+    return ALL_CARDS[card_id]
+
+
+def shuffled(name, count=None, rng=random):
+    """
+    Returns a shuffled list of up to `count` cards from a pool. Only the
+    selected cards are copied; the catalog itself is never reordered.
+    """
+    pool = POOLS[name]
+    if count is None or count > len(pool):
+        count = len(pool)
+    return rng.sample(pool, count)
+
+
+if __name__ == '__main__':
+    # Compiles the card files into data/cards.bin.
+    path = os.path.join(DATA_DIR, COMPILED_NAME)
+    data = compile_catalog()
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+    print('Wrote {count} cards, {size} bytes, to {path}'.format(
+        count=len(catalog.Catalog(data)), size=len(data), path=path))
@@ -0,0 +1,218 @@
+"""
+The compiled card catalog: a compact binary form of the card data that
+every worker can mmap and read in place.
+
+    header
+    fields    (name, type) per field
+    pools     (name, first card id, card count) per pool
+    strings   offsets into a UTF-8 blob, one more than there are strings
+    blob
+    records   one fixed-width row of int32s per card, one per field
+    index     card ids sorted by card code, for binary search
+
+Strings are stored once and referenced by number. Only the fields in
+FIELDS are kept, so flavor text, illustrators and so on are dropped.
+"""
+
+import mmap
+import struct
+
+
+MAGIC = b'ANRC'
+VERSION = 1
+
+STR, INT, BOOL = 0, 1, 2
+
+FIELDS = (
+    ('code', STR),
+    ('title', STR),
+    ('side_code', STR),
+    ('faction_code', STR),
+    ('type_code', STR),
+    ('pack_code', STR),
+    ('keywords', STR),
+    ('text', STR),
+    ('deck_limit', INT),
+    ('uniqueness', BOOL),
+    ('cost', INT),
+    ('faction_cost', INT),
+    ('trash_cost', INT),
+    ('strength', INT),
+    ('advancement_cost', INT),
+    ('agenda_points', INT),
+    ('memory_cost', INT),
+    ('base_link', INT),
+    ('influence_limit', INT),
+    ('minimum_deck_size', INT)
+)
+
+# Cell values that can't be a string number or a real stat.
+MISSING = -2 ** 31
+NULL = MISSING + 1
+
+_HEADER = struct.Struct('<4sHHIIIIIIIII')
+_FIELD = struct.Struct('<iI')
+_POOL = struct.Struct('<iII')
+_UINT = struct.Struct('<I')
+_INT = struct.Struct('<i')
+
+
+def build(pools):
+    """
+    Compiles `pools`, a list of (pool name, list of card dicts), into the
+    bytes of a catalog. Card ids are assigned in order across the pools.
+    """
+    strings = []
+    string_ids = {}
+
+    def intern(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    def cell(value, kind):
+        if value is None:
+            return NULL
+        if kind == STR:
+            return intern(value)
+        return int(value)
+
+    field_rows = [_FIELD.pack(intern(name), kind) for name, kind in FIELDS]
+    pool_rows = []
+    records = []
+    codes = []
+    for name, cards in pools:
+        pool_rows.append(_POOL.pack(intern(name), len(codes), len(cards)))
+        for card in cards:
+            codes.append(card['code'])
+            records.append([
+                cell(card[name], kind) if name in card else MISSING
+                for name, kind in FIELDS
+            ])
+    index = sorted(range(len(codes)), key=codes.__getitem__)
+
+    blob = bytearray()
+    offsets = []
+    for value in strings:
+        offsets.append(len(blob))
+        blob.extend(value.encode('utf-8'))
+    offsets.append(len(blob))
+
+    record = struct.Struct('<{n}i'.format(n=len(FIELDS)))
+    sections = [
+        b''.join(field_rows),
+        b''.join(pool_rows),
+        b''.join(_UINT.pack(offset) for offset in offsets),
+        bytes(blob),
+        b''.join(record.pack(*row) for row in records),
+        b''.join(_UINT.pack(card_id) for card_id in index)
+    ]
+    section_offsets = []
+    position = _HEADER.size
+    for section in sections:
+        section_offsets.append(position)
+        position += len(section)
+    header = _HEADER.pack(MAGIC, VERSION, len(FIELDS), len(codes),
+                          len(pool_rows), len(strings), *section_offsets)
+    return header + b''.join(sections)
+
+
+class Catalog:
+    """
+    Reads a compiled catalog from any buffer, usually an mmap of the
+    file. Nothing is copied out of the buffer until a value is asked for.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        (magic, version, num_fields, self.num_cards, num_pools,
+         num_strings, fields_at, pools_at, self._strings_at, self._blob_at,
+         self._records_at, self._index_at) = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a version {version} card catalog.'.format(
+                version=VERSION))
+        self._row_size = num_fields * _INT.size
+        # Strings decoded so far, by number. Titles and codes are read
+        # on every pick, so each is only decoded once.
+        self._decoded = {}
+        # name -> (column, type)
+        self.fields = {}
+        for column in range(num_fields):
+            name, kind = _FIELD.unpack_from(
+                buffer, fields_at + column * _FIELD.size)
+            self.fields[self.string(name)] = (column, kind)
+        # name -> (first card id, count)
+        self.pools = {}
+        for pool in range(num_pools):
+            name, first, count = _POOL.unpack_from(
+                buffer, pools_at + pool * _POOL.size)
+            self.pools[self.string(name)] = (first, count)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return self.num_cards
+
+    def string(self, number):
+        value = self._decoded.get(number)
+        if value is None:
+            value = self._decoded[number] = str(
+                self._string_bytes(number), 'utf-8')
+        return value
+
+    def _string_bytes(self, number):
+        at = self._strings_at + number * _UINT.size
+        start = self._blob_at + _UINT.unpack_from(self._buffer, at)[0]
+        end = self._blob_at + _UINT.unpack_from(
+            self._buffer, at + _UINT.size)[0]
+        return self._buffer[start:end]
+
+    def _cell(self, card_id, column):
+        if not 0 <= card_id < self.num_cards:
+            raise IndexError(card_id)
+        return _INT.unpack_from(
+            self._buffer,
+            self._records_at + card_id * self._row_size + column * _INT.size
+        )[0]
+
+    def value(self, card_id, name):
+        """
+        Returns a field of a card, raising KeyError if the card doesn't
+        have it.
+        """
+        column, kind = self.fields[name]
+        raw = self._cell(card_id, column)
+        if raw == MISSING:
+            raise KeyError(name)
+        if raw == NULL:
+            return None
+        if kind == STR:
+            return self.string(raw)
+        if kind == BOOL:
+            return bool(raw)
+        return raw
+
+    def find(self, code):
+        """
+        Returns the id of the card with `code`, or None. A binary search
+        over the code index.
+        """
+        target = code.encode('utf-8')
+        column = self.fields['code'][0]
+        low, high = 0, self.num_cards
+        while low < high:
+            middle = (low + high) // 2
+            card_id = _UINT.unpack_from(
+                self._buffer, self._index_at + middle * _UINT.size)[0]
+            middle_code = self._string_bytes(self._cell(card_id, column))
+            if middle_code == target:
+                return card_id
+            if middle_code < target:
+                low = middle + 1
+            else:
+                high = middle
+        return None
@@ -0,0 +1,77 @@
+"""
+Each player's picks for a side, kept grouped as they are made so the
+export never has to walk the whole pick list.
+
+A decklist is a plain dict so it can live in the state store:
+
+    {'cards': {card id: picks}, 'types': {type_code: picks},
+     'factions': {faction_code: picks}, 'total': picks}
+
+Card ids are kept as strings, which is what they come back as after a
+round trip through JSON.
+
+The export is NetrunnerDB's plain text format, one `<quantity> <title>`
+line per card grouped under type headings, so it can be pasted straight
+into a deckbuilder.
+"""
+
+import cards
+
+
+SIDES = ('corp', 'runner')
+
+TYPE_ORDER = (
+    'identity', 'agenda', 'asset', 'upgrade', 'operation', 'ice',
+    'event', 'hardware', 'resource', 'program'
+)
+
+
+def new():
+    return {'cards': {}, 'types': {}, 'factions': {}, 'total': 0}
+
+
+def add(decklist, card):
+    for group, key in (('cards', str(card.id)),
+                       ('types', card.type_code),
+                       ('factions', card.faction_code)):
+        counts = decklist[group]
+        counts[key] = counts.get(key, 0) + 1
+    decklist['total'] += 1
+
+
+def export_side(heading, decklist):
+    """
+    Renders one side. Identities are listed once each and every other
+    card at its deck limit, as a player drafting a card can run a full
+    playset of it.
+    """
+    by_type = {}
+    for card_id in decklist['cards']:
+        card = cards.get_card_by_id(int(card_id))
+        quantity = 1 if card.type_code == 'identity' else card.deck_limit
+        by_type.setdefault(card.type_code, []).append((card.title, quantity))
+    lines = [heading]
+    for type_code in sorted(by_type, key=_type_rank):
+        group = sorted(by_type[type_code])
+        lines.append('')
+        lines.append('{type} ({count})'.format(
+            type=type_code.title(),
+            count=sum(quantity for _, quantity in group)))
+        for title, quantity in group:
+            lines.append('{quantity} {title}'.format(
+                quantity=quantity, title=title))
+    return '\n'.join(lines)
+
+
+def export(decklists):
+    """
+    Renders both sides of a player's picks as one block of text.
+    """
+    return '\n\n\n'.join(
+        export_side(side.title(), decklists[side]) for side in SIDES) + '\n'
+
+
+def _type_rank(type_code):
+    if type_code in TYPE_ORDER:
+        return TYPE_ORDER.index(type_code), type_code
+    return len(TYPE_ORDER), type_code
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+from slack.errors import SlackApiError
+
+from workers import KeyedQueue
+
+
+logger = logging.getLogger(__name__)
+
+
+class Batch:
+    """
+    Tracks a group of queued Slack calls and the errors they raised.
+    """
+
+    def __init__(self, size):
+        self.errors = []
+        self._remaining = size
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if not size:
+            self._done.set()
+
+    def _finish(self, error=None):
+        with self._lock:
+            if error is not None:
+                self.errors.append(error)
+            self._remaining -= 1
+            if not self._remaining:
+                self._done.set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.errors
+
+
+class Dispatcher:
+    """
+    Sends Slack messages from a bounded thread pool.
+
+    Messages for the same channel are sent in the order they were queued
+    and messages for different channels go out concurrently. A 429 from
+    Slack pauses every send until its Retry-After has passed, then the
+    call is retried.
+    """
+
+    def __init__(self, client, max_workers=8, max_retries=3):
+        self.client = client
+        self.max_retries = max_retries
+        self._queue = KeyedQueue(max_workers, 'slack-dispatch')
+        self._resume_at = 0
+        self._lock = threading.Lock()
+
+    def call(self, method, batch=None, on_sent=None, **kwargs):
+        """
+        Queues a Slack API call. `on_sent`, if given, is called with
+        Slack's response once the call succeeds, on the sending thread.
+        """
+        if batch is None:
+            batch = Batch(1)
+        self._queue.submit(kwargs.get('channel'), self._send, batch,
+                           method, kwargs, on_sent)
+        return batch
+
+    def post_messages(self, messages):
+        """
+        Queues a chat.postMessage for each dict of arguments, or a
+        chat.update for dicts carrying the ts of a message to edit, and
+        returns without waiting for Slack. An `on_sent` entry is passed
+        to `call` rather than to Slack.
+        """
+        batch = Batch(len(messages))
+        for message in messages:
+            method = 'chat_update' if 'ts' in message else 'chat_postMessage'
+            message = dict(message)
+            on_sent = message.pop('on_sent', None)
+            self.call(method, batch, on_sent, **message)
+        return batch
+
+    def join(self, timeout=None):
+        return self._queue.join(timeout)
+
+    def _wait_for_rate_limit(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _fail(self, batch, method, kwargs, error):
+        logger.error('Slack %s to %s failed: %s',
+                     method, kwargs.get('channel'), error)
+        batch._finish((method, kwargs, error))
+
+    def _send(self, batch, method, kwargs, on_sent=None):
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            try:
+                response = getattr(self.client, method)(**kwargs)
+            except SlackApiError as e:
+                if (e.response.status_code == 429
+                        and attempt < self.max_retries):
+                    retry_after = int(
+                        e.response.headers.get('Retry-After', 1))
+                    with self._lock:
+                        self._resume_at = max(
+                            self._resume_at, time.monotonic() + retry_after)
+                    continue
+                self._fail(batch, method, kwargs, e)
+                return
+            except Exception as e:
+                self._fail(batch, method, kwargs, e)
+                return
+            if on_sent is not None:
+                try:
+                    on_sent(response)
+                except Exception:
+                    logger.exception('Handling the response to Slack %s '
+                                     'failed', method)
+            batch._finish()
+            return
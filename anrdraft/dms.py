@@ -0,0 +1,42 @@
+import threading
+import time
+
+from workers import KeyedQueue
+
+
+class DmResolver:
+    """
+    Finds the DM channel for a user with conversations.open and caches it
+    across drafts. Entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, client, ttl=24 * 60 * 60):
+        self.client = client
+        self.ttl = ttl
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._queue = KeyedQueue(2, 'dm-warm')
+
+    def cached(self, user_id):
+        with self._lock:
+            entry = self._channels.get(user_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def resolve(self, user_id):
+        channel = self.cached(user_id)
+        if channel is None:
+            response = self.client.conversations_open(users=user_id)
+            channel = response['channel']['id']
+            with self._lock:
+                self._channels[user_id] = (channel, time.monotonic() + self.ttl)
+        return channel
+
+    def warm(self, user_id):
+        """
+        Resolves the user's DM channel in the background so a later
+        resolve() is served from the cache.
+        """
+        if self.cached(user_id) is None:
+            self._queue.submit(user_id, self.resolve, user_id)
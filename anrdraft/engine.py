@@ -0,0 +1,222 @@
+"""
+The draft itself: dealing packs, seating players, taking picks and
+passing packs on.
+
+Every function works on one draft's state dict, as kept in the DRAFTS
+table, and only changes that dict. Nothing here talks to Slack, the
+store or the journal, so drafts can be run headless by
+bench/simulate.py. anrdraft.py wraps these with the lookups, pick timers
+and messages around them.
+"""
+
+import random
+
+import cards
+import decklists
+import metrics
+import packs
+
+
+def new_draft(creator, alternate_passing=False):
+    return {
+        'metadata': {
+            'creator': creator,
+            'has_started': False,
+            'stage': 0,
+            # Pass right in even rounds instead of always left.
+            'alternate_passing': alternate_passing
+        },
+        'players': {},
+        'seats': [],
+        'counters': {
+            # Packs dealt but not yet opened.
+            'packs_unopened': 0,
+            # Opened packs that still have cards, open or in an inbox.
+            'packs_in_flight': 0,
+            # Players with a pack in their inbox but none open.
+            'needs_pack': []
+        }
+    }
+
+
+def new_player():
+    return {
+        'inbox': [],
+        'packs': [],
+        'picks': {
+            'corp': [],
+            'runner': []
+        },
+        # the same picks grouped for export, see decklists.py
+        'decklist': {
+            'corp': decklists.new(),
+            'runner': decklists.new()
+        },
+        'has_open_pack': False,
+        'generation': 0,
+        # [channel, ts] of the message showing this player's pack
+        'pack_message': None
+    }
+
+
+# Getters
+
+def get_players(draft):
+    return draft['players'].keys()
+
+
+def get_left_neighbour(draft, player):
+    seats = draft['seats']
+    return seats[(draft['players'][player]['seat_number'] + 1) % len(seats)]
+
+
+def get_right_neighbour(draft, player):
+    seats = draft['seats']
+    return seats[(draft['players'][player]['seat_number'] - 1) % len(seats)]
+
+
+def get_decklists(draft, player):
+    player_info = draft['players'][player]
+    if 'decklist' not in player_info:
+        # Drafts started before picks were grouped as they were made.
+        player_info['decklist'] = {}
+        for side in decklists.SIDES:
+            player_info['decklist'][side] = decklists.new()
+            for card_id in player_info['picks'][side]:
+                decklists.add(player_info['decklist'][side],
+                              cards.get_card_by_id(card_id))
+    return player_info['decklist']
+
+
+def round_finished(draft):
+    return draft['counters']['packs_in_flight'] == 0
+
+
+def draft_finished(draft):
+    counters = draft['counters']
+    return counters['packs_in_flight'] == 0 and counters['packs_unopened'] == 0
+
+
+# Setup
+
+def deal(draft, seed=None):
+    """
+    Deals every player's packs. The seed is kept in the draft metadata
+    so the deal can be reproduced.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    draft['metadata']['seed'] = seed
+    players = list(get_players(draft))
+    dealt = packs.deal(len(players), seed)
+    for player, player_packs in zip(players, dealt):
+        draft['players'][player]['packs'] = player_packs
+    draft['counters']['packs_unopened'] = sum(
+        len(player_packs) for player_packs in dealt)
+
+
+def assign_seats(draft, seats=None, rng=random):
+    """
+    Seats players in a random order unless one is given. `seats` lists
+    players by seat number so neighbours can be looked up directly.
+    """
+    if seats is None:
+        seats = list(get_players(draft))
+        rng.shuffle(seats)
+    draft['seats'] = seats
+    for seat_number, player in enumerate(seats):
+        draft['players'][player]['seat_number'] = seat_number
+
+
+# Picking and Passing
+
+def open_new_pack(draft):
+    """
+    Opens every player's next unopened pack to start a round.
+    After this the pack-sending logic is entirely event-driven.
+    """
+    draft['metadata']['stage'] += 1
+    counters = draft['counters']
+    counters['packs_unopened'] -= len(draft['players'])
+    counters['packs_in_flight'] += len(draft['players'])
+    for player, player_info in draft['players'].items():
+        player_info['inbox'].append(player_info['packs'].pop(0))
+        mark_pack_open(draft, player)
+    metrics.ROUNDS.inc()
+
+
+def mark_pack_open(draft, player):
+    """
+    Opening a pack starts a new generation for the player, so buttons on
+    older messages stop working.
+    """
+    player_info = draft['players'][player]
+    player_info['has_open_pack'] = True
+    player_info['generation'] += 1
+
+
+def apply_pick(draft, player, slot):
+    """
+    Takes the card in `slot` of the player's open pack, passes the rest
+    of the pack on and returns the card.
+    """
+    player_info = draft['players'][player]
+    pack = player_info['inbox'].pop(0)
+    picked_card = cards.get_card_by_id(pack.pop(slot))
+    add_card_to_picks(draft, player, picked_card)
+    metrics.PICKS.inc()
+    player_info['has_open_pack'] = False
+    if len(pack) > 0:
+        pass_pack(draft, player, pack)
+    else:
+        draft['counters']['packs_in_flight'] -= 1
+    if len(player_info['inbox']) > 0:
+        mark_needs_pack(draft, player)
+    return picked_card
+
+
+def add_card_to_picks(draft, player, picked_card):
+    player_info = draft['players'][player]
+    player_info['picks'][picked_card.side_code].append(picked_card.id)
+    decklists.add(get_decklists(draft, player)[picked_card.side_code],
+                  picked_card)
+
+
+def pass_pack(draft, player, pack):
+    # Packs go left, or with alternate_passing right in even rounds.
+    metadata = draft['metadata']
+    if metadata.get('alternate_passing') and not metadata['stage'] % 2:
+        next_player = get_right_neighbour(draft, player)
+    else:
+        next_player = get_left_neighbour(draft, player)
+    next_info = draft['players'][next_player]
+    next_info['inbox'].append(pack)
+    metrics.PASSES.inc()
+    if not next_info['has_open_pack']:
+        mark_needs_pack(draft, next_player)
+
+
+def mark_needs_pack(draft, player):
+    needs_pack = draft['counters']['needs_pack']
+    if player not in needs_pack:
+        needs_pack.append(player)
+
+
+def open_next_pack(draft, player):
+    mark_pack_open(draft, player)
+    draft['counters']['needs_pack'].remove(player)
+
+
+def advance(draft):
+    """
+    Opens the packs waiting for players and starts the next round once
+    the current one is over. Returns the players whose waiting pack was
+    opened and whether a new round started.
+    """
+    opened = list(draft['counters']['needs_pack'])
+    for player in opened:
+        open_next_pack(draft, player)
+    new_round = round_finished(draft) and not draft_finished(draft)
+    if new_round:
+        open_new_pack(draft)
+    return opened, new_round
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class DeliveryLog:
+    """
+    A bounded LRU of the interactions already accepted, so a retried or
+    double-clicked delivery can be answered without touching draft state.
+
+    Each entry keeps when the interaction first arrived, how many times
+    it has been delivered and the last X-Slack-Retry-Num seen for it.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def accept(self, key, retry_num=None):
+        """
+        Records a delivery of `key`. Returns True the first time, and
+        False for every later delivery while it is still remembered.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry['deliveries'] += 1
+                if retry_num is not None:
+                    entry['retry_num'] = retry_num
+                return False
+            self._entries[key] = {
+                'first_seen': time.time(),
+                'deliveries': 1,
+                'retry_num': retry_num
+            }
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry is not None else None
+
+    def __len__(self):
+        return len(self._entries)
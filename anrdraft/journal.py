@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import store
+
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value):
+    body = json.dumps(
+        value, separators=(',', ':'), default=store.json_default
+    ).encode('utf-8')
+    return str(len(body)).encode('ascii') + b' ' + body + b'\n'
+
+
+def _decode_all(data):
+    """
+    Reads `<length> <json>\\n` records from `data`. Returns the decoded
+    records and the offset just past the last complete one, so a record
+    torn by a crash mid-write can be cut off.
+    """
+    records = []
+    offset = 0
+    while offset < len(data):
+        space = data.find(b' ', offset)
+        if space == -1 or not data[offset:space].isdigit():
+            break
+        end = space + 1 + int(data[offset:space])
+        if end >= len(data) or data[end:end + 1] != b'\n':
+            break
+        try:
+            records.append(json.loads(data[space + 1:end].decode('utf-8')))
+        except ValueError:
+            break
+        offset = end + 1
+    return records, offset
+
+
+class Journal:
+    """
+    An append-only log of draft events next to a compact snapshot of the
+    whole state.
+
+    Each event costs one write to the end of the log. A background thread
+    fsyncs the log every `fsync_interval` seconds if anything was written,
+    so a crash loses at most that much. After `snapshot_every` events the
+    caller should write a snapshot, which replaces the log.
+
+    Events are numbered, and each snapshot records the number of the last
+    event it includes, so events left in the log by a crash while taking
+    a snapshot can be told apart from newer ones.
+    """
+
+    def __init__(self, path, fsync_interval=0.5, snapshot_every=1000):
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.snapshot_every = snapshot_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._events = 0
+        # Number of the last event appended.
+        self._seq = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._syncer = threading.Thread(
+            target=self._sync_forever, name='journal-fsync', daemon=True)
+        self._syncer.start()
+
+    def append(self, event):
+        with self._lock:
+            self._seq += 1
+            os.write(self._fd, _encode([self._seq, event]))
+            self._dirty = True
+            self._events += 1
+
+    def needs_snapshot(self):
+        return self._events >= self.snapshot_every
+
+    def snapshot(self, state):
+        """
+        Replaces the snapshot with `state` and then empties the log. The
+        two steps aren't atomic together: a crash between them leaves
+        events in the log that the snapshot already includes, which
+        `load` returns numbered so the caller can skip them. Must be
+        called while no other thread can change the state.
+        """
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_encode({'seq': self._seq, 'state': state}))
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            os.replace(tmp_path, self.snapshot_path)
+            os.ftruncate(self._fd, 0)
+            os.fsync(self._fd)
+            self._dirty = False
+            self._events = 0
+
+    def load(self):
+        """
+        Returns the last snapshot (or None), the number of the last event
+        it includes, and the logged events as (number, event) pairs. Events
+        numbered at or below the snapshot's are already in it.
+        """
+        snapshot = None
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                records, _ = _decode_all(f.read())
+            if records:
+                snapshot = records[0]
+                if 'seq' in snapshot and 'state' in snapshot:
+                    snapshot_seq, snapshot = snapshot['seq'], snapshot['state']
+        with self._lock:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            data = b''
+            while True:
+                chunk = os.read(self._fd, 1 << 20)
+                if not chunk:
+                    break
+                data += chunk
+            records, offset = _decode_all(data)
+            if offset < len(data):
+                logger.warning('Dropping %d torn bytes from %s',
+                               len(data) - offset, self.path)
+                os.ftruncate(self._fd, offset)
+            events = []
+            for record in records:
+                if isinstance(record[0], int):
+                    events.append((record[0], record[1]))
+                else:
+                    # Logged before events were numbered.
+                    events.append((None, record))
+            self._events = len(events)
+            self._seq = max([snapshot_seq] + [
+                seq for seq, _ in events if seq is not None])
+        return snapshot, snapshot_seq, events
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                os.fsync(self._fd)
+                self._dirty = False
+
+    def _sync_forever(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('Could not fsync %s', self.path)
@@ -0,0 +1,178 @@
+"""
+In-process counters and latency histograms, rendered in the Prometheus
+text format by the /metrics endpoint. Each worker process keeps its own.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0
+)
+
+REGISTRY = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{name}="{value}"'.format(
+            name=name,
+            value=str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+    ) + '}'
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [
+            '# HELP {name} {help}'.format(name=self.name, help=self.help_text),
+            '# TYPE {name} counter'.format(name=self.name)
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append('{name}{labels} {value}'.format(
+                name=self.name,
+                labels=_format_labels(self.labels, key),
+                value=value))
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # key -> [count per bucket (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [
+            '# HELP {name} {help}'.format(name=self.name, help=self.help_text),
+            '# TYPE {name} histogram'.format(name=self.name)
+        ]
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append('{name}_bucket{labels} {count}'.format(
+                    name=self.name,
+                    labels=_format_labels(self.labels, key, [('le', bound)]),
+                    count=cumulative))
+            labels = _format_labels(self.labels, key)
+            lines.append('{name}_sum{labels} {total}'.format(
+                name=self.name, labels=labels, total=total))
+            lines.append('{name}_count{labels} {count}'.format(
+                name=self.name, labels=labels, count=cumulative))
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class InstrumentedClient:
+    """
+    Wraps a Slack WebClient and times every API method called through it.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                SLACK_ERRORS.inc(method=name)
+                raise
+            finally:
+                SLACK_SECONDS.observe(
+                    time.perf_counter() - start, method=name)
+        return call
+
+
+AUTH_REJECTED = Counter(
+    'anrdraft_auth_rejected_total',
+    'Requests rejected by signature verification.', labels=('reason',))
+DUPLICATE_ACTIONS = Counter(
+    'anrdraft_duplicate_actions_total',
+    'Pick deliveries answered from the delivery log, by Slack retry reason.',
+    labels=('reason',))
+REQUEST_SECONDS = Histogram(
+    'anrdraft_request_seconds', 'Time spent handling each endpoint.',
+    labels=('endpoint', 'status'))
+SLACK_SECONDS = Histogram(
+    'anrdraft_slack_call_seconds', 'Time spent in each Slack API call.',
+    labels=('method',))
+SLACK_ERRORS = Counter(
+    'anrdraft_slack_call_errors_total', 'Slack API calls that raised.',
+    labels=('method',))
+WEBHOOK_SECONDS = Histogram(
+    'anrdraft_webhook_seconds', 'Time spent posting to response_url.')
+PICK_SECONDS = Histogram(
+    'anrdraft_pick_seconds',
+    'Time spent applying a queued pick and queueing its messages.')
+PICKS = Counter('anrdraft_picks_total', 'Picks applied.')
+AUTO_PICKS = Counter(
+    'anrdraft_auto_picks_total', 'Picks made for players who ran out of time.')
+PASSES = Counter('anrdraft_passes_total', 'Packs passed to a neighbour.')
+ROUNDS = Counter('anrdraft_rounds_total', 'Pack rounds started.')
+DRAFTS_COMPLETED = Counter(
+    'anrdraft_drafts_completed_total', 'Drafts played to the end.')
@@ -0,0 +1,61 @@
+from array import array
+import random
+
+import cards
+
+
+IDS_PER_PACK = 5
+CARDS_PER_PACK = 15
+CARD_PACKS_PER_SIDE = 3
+
+SIDES = (
+    ('corp_ids', 'corp_cards'),
+    ('runner_ids', 'runner_cards')
+)
+
+
+def _split(cards_, num_players, num_packs):
+    """
+    Cuts a shuffled list into `num_packs` rounds of one pack per player.
+    Leftover cards that can't fill a whole round are dropped.
+    """
+    size = len(cards_) // (num_players * num_packs)
+    rounds = []
+    for round_num in range(num_packs):
+        start = round_num * num_players * size
+        rounds.append([
+            cards_[start + seat * size:start + (seat + 1) * size]
+            for seat in range(num_players)
+        ])
+    return rounds
+
+
+def deal(num_players, seed=None, ids_per_pack=IDS_PER_PACK,
+         cards_per_pack=CARDS_PER_PACK,
+         card_packs_per_side=CARD_PACKS_PER_SIDE):
+    """
+    Deals every pack for a draft and returns one list of packs per
+    player, in the order they will be opened: for each side an identity
+    pack followed by `card_packs_per_side` packs of cards.
+
+    Packs are arrays of card ids. Each pool is sampled once and sliced
+    into packs, so the same seed always gives the same deal.
+    """
+    rng = random.Random(seed)
+    dealt = [[] for _ in range(num_players)]
+    for ids_pool, cards_pool in SIDES:
+        ids = array('H', (
+            card.id for card in
+            cards.shuffled(ids_pool, num_players * ids_per_pack, rng)))
+        deck = array('H', (
+            card.id for card in cards.shuffled(
+                cards_pool,
+                num_players * cards_per_pack * card_packs_per_side,
+                rng
+            )))
+        rounds = _split(ids, num_players, 1)
+        rounds.extend(_split(deck, num_players, card_packs_per_side))
+        for round_packs in rounds:
+            for seat, pack in enumerate(round_packs):
+                dealt[seat].append(pack)
+    return dealt
@@ -0,0 +1,28 @@
+import cards
+from templates import blocks, templates
+
+
+_CARD_BLOCKS = {}
+
+
+def card_block(card):
+    """
+    Returns the pick section for a card with an empty button value. The
+    text is formatted once per card and reused for every pack it shows
+    up in.
+    """
+    block = _CARD_BLOCKS.get(card.id)
+    if block is None:
+        block = _CARD_BLOCKS[card.id] = blocks.text_with_button(
+            templates.format(card), card.title, '')
+    return block
+
+
+def pick_block(card, button_value):
+    block = card_block(card)
+    return dict(block, accessory=dict(block['accessory'], value=button_value))
+
+
+def warm():
+    for card in cards.ALL_CARDS:
+        card_block(card)
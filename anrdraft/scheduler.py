@@ -0,0 +1,86 @@
+import logging
+import math
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWheel:
+    """
+    Runs callbacks after a delay from one background thread, however many
+    timers are pending.
+
+    Timers hash into `slots` buckets of `tick` seconds each, and a timer
+    further out than one turn of the wheel waits out the extra turns in
+    its bucket. Each timer has a key, so scheduling a key again replaces
+    its timer. Both schedule and cancel are O(1).
+
+    Callbacks run on the wheel's thread and should only hand work off,
+    e.g. to a KeyedQueue.
+    """
+
+    def __init__(self, tick=1.0, slots=512, name='timers'):
+        self.tick = tick
+        self.slots = slots
+        self.name = name
+        # bucket -> {key: [turns left, fn, args]}
+        self._buckets = [{} for _ in range(slots)]
+        # key -> bucket
+        self._timers = {}
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, key, delay, fn, *args):
+        ticks = max(1, int(math.ceil(delay / self.tick)))
+        with self._lock:
+            self._cancel(key)
+            bucket = (self._cursor + ticks) % self.slots
+            turns = (ticks - 1) // self.slots
+            self._buckets[bucket][key] = [turns, fn, args]
+            self._timers[key] = bucket
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def cancel(self, key):
+        with self._lock:
+            self._cancel(key)
+
+    def __len__(self):
+        return len(self._timers)
+
+    def _cancel(self, key):
+        bucket = self._timers.pop(key, None)
+        if bucket is not None:
+            del self._buckets[bucket][key]
+
+    def _advance(self):
+        due = []
+        with self._lock:
+            self._cursor = (self._cursor + 1) % self.slots
+            bucket = self._buckets[self._cursor]
+            for key, entry in list(bucket.items()):
+                if entry[0]:
+                    entry[0] -= 1
+                    continue
+                del bucket[key]
+                del self._timers[key]
+                due.append(entry)
+        for _, fn, args in due:
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception('Timer callback failed in %s', self.name)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.tick
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._advance()
@@ -0,0 +1,92 @@
+"""
+Helpers for starting the app cheaply.
+
+Under gunicorn with preload_app the master imports the app once and the
+workers fork from it, sharing the card catalog and rendered blocks. So
+importing the app only builds plain data. Anything that owns threads,
+sockets or open files is created in each worker by a `Once` when it
+starts, or by a `Lazy` or `PerThread` when it is first used.
+"""
+
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds spent in each startup phase of this process, for /debug and
+# bench/startup.py.
+TIMINGS = {}
+
+
+class Lazy:
+    """
+    Stands in for the object `factory` returns, building it on first
+    attribute access.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    with timed('build_' + getattr(
+                            self._factory, '__name__', 'lazy')):
+                        self._target = self._factory()
+                target = self._target
+        return getattr(target, name)
+
+
+class PerThread:
+    """
+    Like `Lazy`, but builds a separate object for each thread that uses
+    it, for objects that can't be shared between threads.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        target = getattr(self._local, 'target', None)
+        if target is None:
+            target = self._local.target = self._factory()
+        return getattr(target, name)
+
+
+class Once:
+    """
+    Calls `fn` the first time it is called and never again, however many
+    threads race to call it.
+    """
+
+    def __init__(self, fn):
+        self._fn = fn
+        self._done = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._done:
+            return
+        with self._lock:
+            if not self._done:
+                with timed(self._fn.__name__):
+                    self._fn()
+                self._done = True
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMINGS[phase] = time.perf_counter() - start
+        logger.info('Startup: %s took %.1f ms', phase, TIMINGS[phase] * 1000)
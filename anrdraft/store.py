@@ -0,0 +1,200 @@
+from array import array
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+
+
+def json_default(value):
+    """
+    Lets json.dumps write the arrays of card ids that packs are kept in.
+    They are read back as lists, which the draft code treats the same.
+    """
+    if isinstance(value, array):
+        return value.tolist()
+    raise TypeError('{name} is not JSON serializable'.format(
+        name=type(value).__name__))
+
+
+class MemoryStore:
+    """
+    Keeps every table in plain dicts. Only safe with a single worker
+    process, which is how the app has always been deployed.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.RLock()
+
+    def table(self, name):
+        return self._tables.setdefault(name, {})
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield
+
+
+_DELETED = object()
+
+
+class SqliteStore:
+    """
+    Keeps tables as JSON records in a SQLite database in WAL mode so any
+    number of worker processes on the same machine can share drafts.
+
+    Records read inside a transaction are cached and written back on
+    commit, so code can keep mutating the nested dicts it gets back.
+    Transactions start with BEGIN IMMEDIATE, which serializes writers
+    across processes and keeps concurrent picks from overwriting each
+    other.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Not kept, so a process that forks after opening the store
+        # doesn't hand its connection to the children.
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                'tbl TEXT NOT NULL, '
+                'key TEXT NOT NULL, '
+                'value TEXT NOT NULL, '
+                'PRIMARY KEY (tbl, key))'
+            )
+        finally:
+            conn.close()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _pending(self):
+        return getattr(self._local, 'pending', None)
+
+    def table(self, name):
+        return SqliteTable(self, name)
+
+    @contextmanager
+    def transaction(self):
+        if self._pending() is not None:
+            # Already inside a transaction on this thread.
+            yield
+            return
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.pending = {}
+        try:
+            yield
+            self._flush(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._local.pending = None
+
+    def _flush(self, conn):
+        for (tbl, key), (value, original) in self._pending().items():
+            if value is _DELETED:
+                if original is not None:
+                    conn.execute(
+                        'DELETE FROM records WHERE tbl = ? AND key = ?',
+                        (tbl, key)
+                    )
+                continue
+            encoded = json.dumps(value, sort_keys=True, default=json_default)
+            if encoded != original:
+                conn.execute(
+                    'INSERT OR REPLACE INTO records (tbl, key, value) '
+                    'VALUES (?, ?, ?)',
+                    (tbl, key, encoded)
+                )
+
+    def _select(self, tbl, key):
+        row = self._conn().execute(
+            'SELECT value FROM records WHERE tbl = ? AND key = ?',
+            (tbl, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _keys(self, tbl):
+        rows = self._conn().execute(
+            'SELECT key FROM records WHERE tbl = ?', (tbl,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+class SqliteTable(MutableMapping):
+
+    def __init__(self, store, name):
+        self._store = store
+        self.name = name
+
+    def _load(self, key):
+        pending = self._store._pending()
+        if pending is None:
+            with self._store.transaction():
+                return self._load(key)
+        entry = pending.get((self.name, key))
+        if entry is None:
+            original = self._store._select(self.name, key)
+            value = _DELETED if original is None else json.loads(original)
+            entry = pending[(self.name, key)] = (value, original)
+        return entry[0]
+
+    def __getitem__(self, key):
+        value = self._load(key)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self._store.transaction():
+            self._load(key)
+            pending = self._store._pending()
+            original = pending[(self.name, key)][1]
+            pending[(self.name, key)] = (value, original)
+
+    def __delitem__(self, key):
+        with self._store.transaction():
+            if self._load(key) is _DELETED:
+                raise KeyError(key)
+            pending = self._store._pending()
+            original = pending[(self.name, key)][1]
+            pending[(self.name, key)] = (_DELETED, original)
+
+    def __contains__(self, key):
+        return self._load(key) is not _DELETED
+
+    def __iter__(self):
+        with self._store.transaction():
+            keys = set(self._store._keys(self.name))
+            for (tbl, key), (value, _) in self._store._pending().items():
+                if tbl != self.name:
+                    continue
+                if value is _DELETED:
+                    keys.discard(key)
+                else:
+                    keys.add(key)
+        return iter(sorted(keys))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def open_store(kind='memory', path=None):
+    if kind == 'memory':
+        return MemoryStore()
+    if kind == 'sqlite':
+        return SqliteStore(path or 'anrdraft.db')
+    raise ValueError('Unknown state store: {kind}'.format(kind=kind))
@@ -187,28 +187,24 @@ def resource_text(card):
     )
 
 
+FORMATTERS = {
+    'identity': identity_text,
+    'agenda': agenda_text,
+    'asset': asset_text,
+    'ice': ice_text,
+    'operation': operation_text,
+    'upgrade': upgrade_text,
+    'event': event_text,
+    'hardware': hardware_text,
+    'program': program_text,
+    'resource': resource_text
+}
+
+
+def raw_text(card):
+    return '```' + json.dumps(dict(card), indent=4, sort_keys=True) + '```'
+
+
 def format(card):
-    card_type = card.get('type_code', 'none')
-
-    if card_type == 'identity':
-        return identity_text(card)
-    elif card_type == 'agenda':
-        return agenda_text(card)
-    elif card_type == 'asset':
-        return asset_text(card)
-    elif card_type == 'ice':
-        return ice_text(card)
-    elif card_type == 'operation':
-        return operation_text(card)
-    elif card_type == 'upgrade':
-        return upgrade_text(card)
-    elif card_type == 'event':
-        return event_text(card)
-    elif card_type == 'hardware':
-        return hardware_text(card)
-    elif card_type == 'program':
-        return program_text(card)
-    elif card_type == 'resource':
-        return resource_text(card)
-    else:
-        return '```' + json.dumps(card, indent=4, sort_keys=True) + '```'
+    formatter = FORMATTERS.get(card.get('type_code', 'none'), raw_text)
+    return formatter(card)
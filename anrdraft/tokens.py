@@ -0,0 +1,32 @@
+"""
+Pick tokens are the values on pick buttons. They carry everything needed
+to apply a pick without searching the pack:
+
+    p1|<draft_id>|<player_name>|<generation>|<slot>
+
+`generation` counts the packs opened for the player so clicks on an old
+message can be told apart from clicks on the current one, and `slot` is
+the card's index in the open pack.
+"""
+
+VERSION = 'p1'
+SEPARATOR = '|'
+
+
+def encode(draft_id, player_name, generation, slot):
+    return SEPARATOR.join(
+        [VERSION, draft_id, player_name, str(generation), str(slot)])
+
+
+def decode(value):
+    """
+    Returns (draft_id, player_name, generation, slot), or None if the
+    value is not a pick token this version understands.
+    """
+    parts = value.split(SEPARATOR)
+    if len(parts) != 5 or parts[0] != VERSION:
+        return None
+    _, draft_id, player_name, generation, slot = parts
+    if not (generation.isdigit() and slot.isdigit()):
+        return None
+    return draft_id, player_name, int(generation), int(slot)
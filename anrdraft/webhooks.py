@@ -0,0 +1,73 @@
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from workers import KeyedQueue
+
+
+logger = logging.getLogger(__name__)
+
+
+def _retry(**kwargs):
+    """
+    Builds a Retry that also retries POSTs. urllib3 1.26 renamed
+    `method_whitelist` to `allowed_methods`, and the lock file pins 1.25.
+    """
+    try:
+        return Retry(allowed_methods=frozenset(['POST']), **kwargs)
+    except TypeError:
+        return Retry(method_whitelist=frozenset(['POST']), **kwargs)
+
+
+class WebhookClient:
+    """
+    Posts JSON to Slack response_url webhooks over one pooled keep-alive
+    session, so picks reuse open connections to hooks.slack.com instead
+    of paying for a TCP and TLS handshake each time.
+
+    Failed posts are retried with exponential backoff, honouring
+    Retry-After on 429s.
+    """
+
+    def __init__(self, pool_size=10, timeout=(3.05, 10), retries=3,
+                 backoff=0.5, max_workers=4):
+        self.timeout = timeout
+        retry = _retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+            pool_block=True
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._queue = KeyedQueue(max_workers, 'webhooks')
+
+    def post(self, url, payload):
+        with metrics.WEBHOOK_SECONDS.time():
+            response = self.session.post(
+                url, json=payload, timeout=self.timeout)
+        if response.status_code >= 400:
+            logger.error('Webhook post failed with HTTP %s',
+                         response.status_code)
+        return response
+
+    def post_async(self, url, payload):
+        """
+        Queues the post on a background thread. Posts to the same URL are
+        sent in order.
+        """
+        self._queue.submit(url, self.post, url, payload)
+
+    def join(self, timeout=None):
+        return self._queue.join(timeout)
@@ -0,0 +1,60 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedQueue:
+    """
+    Runs jobs on a bounded thread pool. Jobs submitted with the same key
+    run one at a time in the order they were submitted, while jobs with
+    different keys run in parallel.
+    """
+
+    def __init__(self, max_workers, name):
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name)
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self._pending += 1
+            queue = self._queues.get(key)
+            start = queue is None
+            if start:
+                queue = self._queues[key] = deque()
+            queue.append((fn, args, kwargs))
+        if start:
+            self._pool.submit(self._drain, key)
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                fn, args, kwargs = queue.popleft()
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception('Job for %s failed', key)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if not self._pending:
+                        self._idle.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Blocks until every submitted job has run. Returns False if the
+        timeout expired first.
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
@@ -0,0 +1,158 @@
+"""
+A local stand-in for the Slack Web API and response_url webhooks.
+
+Serves `/api/<method>` for the methods the app calls and `/response/...`
+for response_url posts. Every call is recorded per channel so simulated
+players can read the messages the app sends them. Latency and 429
+responses can be injected to see how the app behaves under a slow or
+rate-limited Slack.
+"""
+
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs
+
+
+class FakeSlack:
+
+    def __init__(self, latency=0.0, rate_limit=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.events = defaultdict(list)
+        self._rng = random.Random(seed)
+        self._ts = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._server = None
+
+    # Server lifecycle
+
+    def start(self, host='127.0.0.1', port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                fake._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(
+            target=self._server.serve_forever, name='fake-slack', daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{host}:{port}'.format(host=host, port=port)
+
+    @property
+    def api_url(self):
+        return self.url + '/api/'
+
+    def response_url(self, name):
+        return '{url}/response/{name}'.format(url=self.url, name=name)
+
+    # Reading what the app sent
+
+    def wait_for_event(self, channel, index, timeout=None):
+        """
+        Returns the `index`th event recorded for `channel`, waiting for it
+        to arrive. Returns None on timeout.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: len(self.events[channel]) > index, timeout)
+            events = self.events[channel]
+            return events[index] if len(events) > index else None
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    # Request handling
+
+    def _handle(self, handler):
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length)
+        path = handler.path.split('?')[0]
+        if path.startswith('/api/'):
+            method = path[len('/api/'):]
+        elif path.startswith('/response/'):
+            method = 'response_url'
+        else:
+            self._reply(handler, 404, {'ok': False, 'error': 'not_found'})
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            limited = (method != 'response_url'
+                       and self._rng.random() < self.rate_limit)
+            if limited:
+                self.rate_limited[method] += 1
+        if limited:
+            self._reply(handler, 429, {'ok': False, 'error': 'ratelimited'},
+                        {'Retry-After': str(self.retry_after)})
+            return
+
+        args = self._parse(handler.headers.get('Content-Type', ''), body)
+        self._reply(handler, 200, self._record(method, path, args))
+
+    def _parse(self, content_type, body):
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}')
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return {key: values[-1] for key, values in
+                    parse_qs(body.decode('utf-8')).items()}
+        return {'raw_bytes': len(body)}
+
+    def _record(self, method, path, args):
+        with self._changed:
+            self._ts += 1
+            ts = '{:d}.000100'.format(self._ts)
+            if method == 'conversations.open':
+                channel = 'D' + args.get('users', '').split(',')[0]
+                return {'ok': True, 'channel': {'id': channel}}
+            if method == 'response_url':
+                channel = path
+            else:
+                channel = args.get('channel', '')
+                if channel.startswith('U'):
+                    # Like Slack, a message to a user id goes to their DM.
+                    channel = 'D' + channel
+            self.events[channel].append((method, args, ts))
+            self._changed.notify_all()
+            return {'ok': True, 'channel': channel, 'ts': args.get('ts', ts)}
+
+    def _reply(self, handler, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        try:
+            handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The app was stopped with calls still in flight.
+            pass
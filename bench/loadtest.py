@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+"""
+Runs whole drafts against the app with simulated players and a local fake
+Slack, and reports endpoint latency, Slack calls per pick and draft
+duration. Everything runs on localhost, so it works offline.
+
+    python bench/loadtest.py --pods 4 --players 8 --latency-ms 50
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+
+from fake_slack import FakeSlack
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), 'anrdraft')
+
+VERIFICATION_TOKEN = 'loadtest-token'
+SIGNING_SECRET = 'loadtest-secret'
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, int(round(pct / 100.0 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def signed(data):
+    """
+    Form-encodes `data` and signs it the way Slack does.
+    """
+    body = urlencode(data).encode('utf-8')
+    timestamp = str(int(time.time()))
+    digest = hmac.new(SIGNING_SECRET.encode('utf-8'),
+                      b'v0:' + timestamp.encode('ascii') + b':' + body,
+                      hashlib.sha256)
+    return body, {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'X-Slack-Request-Timestamp': timestamp,
+        'X-Slack-Signature': 'v0=' + digest.hexdigest()
+    }
+
+
+class Stats:
+
+    def __init__(self):
+        self.latencies = {}
+        self.picks = 0
+        self.errors = []
+        self.durations = []
+        self._lock = threading.Lock()
+
+    def timed_post(self, session, url, endpoint, data):
+        body, headers = signed(data)
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                url + endpoint, data=body, headers=headers, timeout=30)
+        except requests.RequestException as e:
+            self.error('{endpoint}: {error}'.format(endpoint=endpoint, error=e))
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+        if response.status_code != 200:
+            self.error('{endpoint}: HTTP {status}'.format(
+                endpoint=endpoint, status=response.status_code))
+        return response
+
+    def error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+    def picked(self):
+        with self._lock:
+            self.picks += 1
+
+    def finished(self, duration):
+        with self._lock:
+            self.durations.append(duration)
+
+
+class Bot:
+
+    def __init__(self, pod, seat, seed):
+        self.name = 'pod{pod}-player{seat}'.format(pod=pod, seat=seat)
+        self.user_id = 'U{pod:03d}{seat:02d}'.format(pod=pod, seat=seat)
+        self.channel = 'D' + self.user_id
+        self.rng = random.Random(seed)
+        self.finished_at = None
+
+    def command(self, text=''):
+        return {
+            'token': VERIFICATION_TOKEN,
+            'user_name': self.name,
+            'user_id': self.user_id,
+            'text': text
+        }
+
+    def pick_payload(self, slack, button, ts):
+        return {
+            'type': 'block_actions',
+            'token': VERIFICATION_TOKEN,
+            'user': {'id': self.user_id, 'username': self.name},
+            'channel': {'id': self.channel},
+            'container': {'message_ts': ts, 'channel_id': self.channel},
+            'response_url': slack.response_url(self.name),
+            'actions': [{
+                'type': 'button',
+                'action_id': button.get('action_id', 'pick'),
+                'value': button['value'],
+                'text': button['text'],
+                'action_ts': '{:.6f}'.format(time.time())
+            }]
+        }
+
+    def play(self, app_url, slack, stats, think, timeout):
+        session = requests.Session()
+        seen = set()
+        index = 0
+        while True:
+            event = slack.wait_for_event(self.channel, index, timeout)
+            if event is None:
+                stats.error('{name} timed out waiting for Slack'.format(
+                    name=self.name))
+                return
+            index += 1
+            method, args, ts = event
+            if 'The draft is complete' in (args.get('text') or ''):
+                self.finished_at = time.perf_counter()
+                return
+            buttons = [block['accessory'] for block in args.get('blocks') or []
+                       if 'accessory' in block]
+            if not buttons or buttons[0]['value'] in seen:
+                continue
+            seen.add(buttons[0]['value'])
+            if think:
+                time.sleep(self.rng.uniform(0, 2 * think))
+            button = self.rng.choice(buttons)
+            payload = self.pick_payload(slack, button, args.get('ts', ts))
+            stats.timed_post(session, app_url, '/actions',
+                             {'payload': json.dumps(payload)})
+            stats.picked()
+
+
+def run_pod(pod, players, app_url, slack, stats, think, timeout, seed):
+    session = requests.Session()
+    bots = [Bot(pod, seat, '{}-{}-{}'.format(seed, pod, seat))
+            for seat in range(players)]
+    creator = bots[0]
+    response = stats.timed_post(
+        session, app_url, '/draft-create', creator.command())
+    if response is None or '`' not in response.text:
+        stats.error('pod {pod} could not create a draft'.format(pod=pod))
+        return
+    draft_id = response.text.split('`')[1]
+    for bot in bots[1:]:
+        stats.timed_post(session, app_url, '/draft-join', bot.command(draft_id))
+
+    threads = [
+        threading.Thread(target=bot.play,
+                         args=(app_url, slack, stats, think, timeout))
+        for bot in bots
+    ]
+    for thread in threads:
+        thread.start()
+    started_at = time.perf_counter()
+    stats.timed_post(session, app_url, '/draft-start', creator.command(draft_id))
+    for thread in threads:
+        thread.join()
+    finished = [bot.finished_at for bot in bots if bot.finished_at]
+    if len(finished) == len(bots):
+        stats.finished(max(finished) - started_at)
+
+
+APP_RUNNER = (
+    'import logging, sys\n'
+    'from werkzeug.serving import run_simple\n'
+    'import anrdraft\n'
+    'logging.getLogger("werkzeug").setLevel(logging.WARNING)\n'
+    'run_simple("127.0.0.1", int(sys.argv[1]), anrdraft.app, threaded=True)\n'
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(slack, extra_env, timeout=30):
+    """
+    Runs the app in its own process so its CPU time isn't shared with
+    the simulated players and fake Slack.
+    """
+    env = dict(os.environ)
+    env.update({
+        'on_heroku': '1',
+        'api_token': 'xoxb-loadtest',
+        'verification_token': VERIFICATION_TOKEN,
+        'signing_secret': SIGNING_SECRET,
+        'sentry_dsn': '',
+        'slack_api_url': slack.api_url
+    })
+    env.update(extra_env)
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-c', APP_RUNNER, str(port)], cwd=APP_DIR, env=env)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('The app exited during startup.')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, 'http://127.0.0.1:{port}'.format(port=port)
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('The app did not start listening in time.')
+
+
+def report(args, stats, slack, elapsed):
+    endpoints = {}
+    for endpoint, values in sorted(stats.latencies.items()):
+        endpoints[endpoint] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000
+        }
+    slack_calls = slack.total_calls()
+    durations = stats.durations
+    return {
+        'pods': args.pods,
+        'players': args.players,
+        'latency_ms': args.latency_ms,
+        'rate_limit': args.rate_limit,
+        'elapsed_s': elapsed,
+        'picks': stats.picks,
+        'picks_per_s': stats.picks / elapsed if elapsed else 0.0,
+        'slack_calls': dict(slack.calls),
+        'rate_limited': dict(slack.rate_limited),
+        'slack_calls_per_pick': (
+            slack_calls / stats.picks if stats.picks else 0.0),
+        'drafts_completed': len(durations),
+        'draft_duration_s': {
+            'mean': sum(durations) / len(durations) if durations else 0.0,
+            'max': max(durations) if durations else 0.0
+        },
+        'endpoints': endpoints,
+        'errors': stats.errors[:20],
+        'error_count': len(stats.errors)
+    }
+
+
+def print_report(result):
+    print('{pods} pods x {players} players, Slack latency {latency_ms} ms, '
+          '429 rate {rate_limit}'.format(**result))
+    print('picks: {picks} in {elapsed_s:.2f}s ({picks_per_s:.1f}/s)'.format(
+        **result))
+    print('slack calls per pick: {:.2f}'.format(
+        result['slack_calls_per_pick']))
+    print('slack calls: {calls}'.format(calls=result['slack_calls']))
+    if result['rate_limited']:
+        print('rate limited: {calls}'.format(calls=result['rate_limited']))
+    print('drafts completed: {done}/{pods}, duration mean {mean:.2f}s '
+          'max {max:.2f}s'.format(done=result['drafts_completed'],
+                                  pods=result['pods'],
+                                  **result['draft_duration_s']))
+    print('{:<16}{:>8}{:>10}{:>10}{:>10}'.format(
+        'endpoint', 'count', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for endpoint, row in result['endpoints'].items():
+        print('{:<16}{count:>8}{p50_ms:>10.2f}{p95_ms:>10.2f}'
+              '{p99_ms:>10.2f}'.format(endpoint, **row))
+    if result['error_count']:
+        print('errors: {count}'.format(count=result['error_count']))
+        for error in result['errors']:
+            print('  ' + error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--pods', type=int, default=4)
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=20.0,
+                        help='delay added to every fake Slack call')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='fraction of Slack API calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--think-ms', type=float, default=0.0,
+                        help='mean time a player waits before picking')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--env', action='append', default=[],
+                        metavar='NAME=VALUE',
+                        help='extra app setting, e.g. state_store=sqlite')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write the results to PATH')
+    args = parser.parse_args()
+
+    slack = FakeSlack(latency=args.latency_ms / 1000.0,
+                      rate_limit=args.rate_limit,
+                      retry_after=args.retry_after,
+                      seed=args.seed).start()
+    extra_env = dict(setting.split('=', 1) for setting in args.env)
+    app_process, app_url = start_app(slack, extra_env)
+
+    stats = Stats()
+    started = time.perf_counter()
+    pods = [
+        threading.Thread(target=run_pod, args=(
+            pod, args.players, app_url, slack, stats,
+            args.think_ms / 1000.0, args.timeout, args.seed))
+        for pod in range(args.pods)
+    ]
+    for pod in pods:
+        pod.start()
+    for pod in pods:
+        pod.join()
+    elapsed = time.perf_counter() - started
+    app_process.terminate()
+    app_process.wait()
+    slack.stop()
+
+    result = report(args, stats, slack, elapsed)
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=4, sort_keys=True)
+    return 1 if result['error_count'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
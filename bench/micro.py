@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""
+Times the draft engine's hot paths at realistic pod sizes with Slack
+calls stubbed out, and compares the results against a saved baseline.
+
+    python bench/micro.py --save baseline.json
+    python bench/micro.py --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), 'anrdraft')
+
+POD_SIZES = (4, 8, 12, 16)
+
+
+class NullDispatcher:
+
+    def post_messages(self, messages):
+        pass
+
+    def call(self, method, batch=None, **kwargs):
+        pass
+
+
+class NullDms:
+
+    def cached(self, user_id):
+        return 'D' + user_id
+
+    def resolve(self, user_id):
+        return 'D' + user_id
+
+    def warm(self, user_id):
+        pass
+
+
+def load_app():
+    os.environ.update({
+        'on_heroku': '1',
+        'api_token': 'xoxb-micro',
+        'verification_token': 'micro',
+        'sentry_dsn': ''
+    })
+    sys.path.insert(0, APP_DIR)
+    import anrdraft
+    anrdraft.DISPATCHER = NullDispatcher()
+    anrdraft.DMS = NullDms()
+    return anrdraft
+
+
+def new_draft(app, num_players):
+    draft_id = app.setup_draft('player0', 'U0')
+    for seat in range(1, num_players):
+        name = 'player{seat}'.format(seat=seat)
+        app.add_player(name, 'U{seat}'.format(seat=seat), draft_id)
+    return draft_id
+
+
+def summarize(samples):
+    return {
+        'us': statistics.median(samples) * 1e6,
+        'mean_us': statistics.mean(samples) * 1e6,
+        'min_us': min(samples) * 1e6,
+        'samples': len(samples)
+    }
+
+
+def best_of(fn, number, repeat=5):
+    return [t / number for t in timeit.Timer(fn).repeat(repeat, number)]
+
+
+def bench_setup_packs(app, num_players, rounds):
+    samples = []
+    for _ in range(rounds):
+        draft_id = new_draft(app, num_players)
+        start = time.perf_counter()
+        app.setup_packs(draft_id)
+        samples.append(time.perf_counter() - start)
+        app.cleanup(draft_id)
+    return summarize(samples)
+
+
+def bench_draft(app, num_players):
+    """
+    Plays a whole draft, always taking the first card, and times each
+    engine step separately.
+    """
+    timings = {'handle_pick': [], 'open_next_pack_or_wait': []}
+    draft_id = new_draft(app, num_players)
+    app.begin_draft(draft_id)
+    while draft_id in app.DRAFTS:
+        for player in list(app.get_players(draft_id)):
+            if not app.player_has_open_pack(draft_id, player):
+                continue
+            info = app.DRAFTS[draft_id]['players'][player]
+            value = app.tokens.encode(
+                draft_id, player, info['generation'], 0)
+            start = time.perf_counter()
+            app.handle_pick([{'value': value}])
+            middle = time.perf_counter()
+            app.open_next_pack_or_wait(draft_id)
+            end = time.perf_counter()
+            timings['handle_pick'].append(middle - start)
+            timings['open_next_pack_or_wait'].append(end - middle)
+            if draft_id not in app.DRAFTS:
+                break
+    return {name: summarize(samples) for name, samples in timings.items()}
+
+
+def bench_pass_pack(app, num_players):
+    draft_id = new_draft(app, num_players)
+    app.begin_draft(draft_id)
+    draft = app.DRAFTS[draft_id]
+    player = draft['seats'][0]
+    neighbour = app.engine.get_left_neighbour(draft, player)
+    inbox = draft['players'][neighbour]['inbox']
+    pack = list(inbox[0])
+
+    def step():
+        app.engine.pass_pack(draft, player, pack)
+        inbox.pop()
+
+    result = summarize(best_of(step, 2000))
+    app.cleanup(draft_id)
+    return result
+
+
+def bench_rendering(app):
+    from templates import blocks, templates
+    cards = app.cards.ALL_CARDS
+    picks = cards[:100]
+    decklists = app.decklists
+    decklist = {side: decklists.new() for side in decklists.SIDES}
+    for card in picks:
+        decklists.add(decklist[card.side_code], card)
+    per_card = len(cards)
+
+    def format_all():
+        for card in cards:
+            templates.format(card)
+
+    def buttons_all():
+        for card in cards:
+            blocks.text_with_button('text', card.title, 'value')
+
+    def pick_blocks_all():
+        for card in cards:
+            app.render.pick_block(card, 'value')
+
+    app.render.warm()
+    return {
+        'templates.format': summarize(
+            [t / per_card for t in best_of(format_all, 5)]),
+        'blocks.text_with_button': summarize(
+            [t / per_card for t in best_of(buttons_all, 5)]),
+        'render.pick_block': summarize(
+            [t / per_card for t in best_of(pick_blocks_all, 5)]),
+        'decklists.add': summarize(
+            [t / len(picks) for t in best_of(
+                lambda: [decklists.add(decklists.new(), card)
+                         for card in picks], 100)]),
+        'decklists.export': summarize(
+            best_of(lambda: decklists.export(decklist), 500))
+    }
+
+
+def run(rounds):
+    app = load_app()
+    results = bench_rendering(app)
+    for num_players in POD_SIZES:
+        suffix = '[{n}]'.format(n=num_players)
+        results['setup_packs' + suffix] = bench_setup_packs(
+            app, num_players, rounds)
+        results['pass_pack' + suffix] = bench_pass_pack(app, num_players)
+        for name, summary in bench_draft(app, num_players).items():
+            results[name + suffix] = summary
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%d %H:%M'),
+        'results': results
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Prints each case next to its baseline and returns the names of the
+    cases that got slower by more than `threshold`.
+    """
+    regressions = []
+    print('{:<36}{:>12}{:>12}{:>9}'.format(
+        'case', 'baseline us', 'current us', 'change'))
+    for name, result in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            print('{:<36}{:>12}{:>12.2f}{:>9}'.format(
+                name, '-', result['us'], 'new'))
+            continue
+        change = result['us'] / base['us'] - 1 if base['us'] else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = ' !'
+        print('{:<36}{:>12.2f}{:>12.2f}{:>+8.1%}{}'.format(
+            name, base['us'], result['us'], change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=50,
+                        help='deals timed per pod size for setup_packs')
+    parser.add_argument('--save', metavar='PATH',
+                        help='write the results as JSON')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='compare against results saved earlier')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    current = run(args.rounds)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=4, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print('{n} regressions over {pct:.0%}'.format(
+                n=len(regressions), pct=args.threshold))
+            return 1
+        return 0
+    for name, result in sorted(current['results'].items()):
+        print('{:<36}{:>12.2f} us'.format(name, result['us']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Plays seeded drafts with bot pickers through the draft engine, without
+Slack, on every core, and reports drafts per second and how the cards
+were dealt and picked.
+
+    python bench/simulate.py --drafts 5000 --players 8 --bot faction
+"""
+
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import random
+import sys
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), 'anrdraft')
+
+# Imported here rather than in a function so pool workers that spawn a
+# fresh interpreter find the app modules too.
+sys.path.insert(0, APP_DIR)
+import cards
+import engine
+import packs
+
+
+# Bot Pickers
+#
+# Each takes the draft, the player and the draft's random generator and
+# returns the slot to pick from the player's open pack.
+
+def pick_first(draft, player, rng):
+    return 0
+
+
+def pick_random(draft, player, rng):
+    return rng.randrange(len(draft['players'][player]['inbox'][0]))
+
+
+def pick_faction(draft, player, rng):
+    """
+    Takes a card from the faction the player has picked most of on that
+    side so far, like a player settling into a faction.
+    """
+    pack = draft['players'][player]['inbox'][0]
+    decklist = engine.get_decklists(draft, player)
+    best, best_score = [], -1
+    for slot, card_id in enumerate(pack):
+        card = cards.get_card_by_id(card_id)
+        score = decklist[card.side_code]['factions'].get(card.faction_code, 0)
+        if score > best_score:
+            best, best_score = [slot], score
+        elif score == best_score:
+            best.append(slot)
+    return rng.choice(best)
+
+
+BOTS = {
+    'first': pick_first,
+    'random': pick_random,
+    'faction': pick_faction
+}
+
+
+def pack_pool(pack_num):
+    """
+    Returns the pool a player's `pack_num`th pack is dealt from, following
+    the order packs.deal returns them in.
+    """
+    side, position = divmod(pack_num, 1 + packs.CARD_PACKS_PER_SIDE)
+    ids_pool, cards_pool = packs.SIDES[side]
+    return ids_pool if position == 0 else cards_pool
+
+
+def play(seed, num_players, bot, alternate_passing=False):
+    """
+    Plays one draft and returns Counters describing it.
+    """
+    rng = random.Random(seed)
+    draft = engine.new_draft('bot0', alternate_passing)
+    for seat in range(num_players):
+        draft['players']['bot{seat}'.format(seat=seat)] = engine.new_player()
+    engine.deal(draft, seed)
+    engine.assign_seats(draft, rng=rng)
+
+    stats = {
+        'pack_sizes': Counter(),
+        'dealt_factions': Counter(),
+        'seat_identities': Counter(),
+        'identities': Counter(),
+        'main_faction': Counter(),
+        'picks': Counter()
+    }
+    for player_info in draft['players'].values():
+        for pack_num, pack in enumerate(player_info['packs']):
+            pool = pack_pool(pack_num)
+            stats['pack_sizes'][pool, len(pack)] += 1
+            for card_id in pack:
+                card = cards.get_card_by_id(card_id)
+                stats['dealt_factions'][card.side_code, card.faction_code] += 1
+
+    draft['metadata']['has_started'] = True
+    engine.open_new_pack(draft)
+    while not engine.draft_finished(draft):
+        for player, player_info in draft['players'].items():
+            if player_info['has_open_pack']:
+                engine.apply_pick(draft, player, bot(draft, player, rng))
+                stats['picks']['total'] += 1
+        engine.advance(draft)
+
+    for player, player_info in draft['players'].items():
+        decklist = engine.get_decklists(draft, player)
+        for side in ('corp', 'runner'):
+            identities = decklist[side]['types'].get('identity', 0)
+            stats['seat_identities'][player_info['seat_number'], side] += (
+                identities)
+            stats['identities'][side, identities] += 1
+            factions = decklist[side]['factions']
+            stats['main_faction'][side] += max(factions.values())
+            stats['main_faction'][side, 'picks'] += decklist[side]['total']
+    return stats
+
+
+def play_batch(seeds, num_players, bot_name, alternate_passing):
+    bot = BOTS[bot_name]
+    totals = {}
+    for seed in seeds:
+        stats = play(seed, num_players, bot, alternate_passing)
+        for name, counts in stats.items():
+            totals.setdefault(name, Counter()).update(counts)
+    return totals
+
+
+def run(num_drafts, num_players, bot_name, seed, workers, batch_size,
+        alternate_passing=False):
+    """
+    Plays `num_drafts` drafts seeded `seed`, `seed + 1`, ... in batches
+    spread over `workers` processes. Returns the merged Counters and the
+    seconds it took.
+    """
+    batches = [
+        range(start, min(start + batch_size, seed + num_drafts))
+        for start in range(seed, seed + num_drafts, batch_size)
+    ]
+    totals = {}
+    started = time.perf_counter()
+    if workers == 1:
+        for seeds in batches:
+            merge(totals, play_batch(
+                seeds, num_players, bot_name, alternate_passing))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(play_batch, seeds, num_players,
+                                   bot_name, alternate_passing)
+                       for seeds in batches]
+            for future in futures:
+                merge(totals, future.result())
+    return totals, time.perf_counter() - started
+
+
+def merge(totals, result):
+    for name, counts in result.items():
+        totals.setdefault(name, Counter()).update(counts)
+
+
+def report(totals, num_drafts, num_players, seconds):
+    """
+    Turns the merged Counters into plain numbers for printing and JSON.
+    """
+    players = num_drafts * num_players
+    pack_sizes = {}
+    for (pool, size), count in sorted(totals['pack_sizes'].items()):
+        pack_sizes.setdefault(pool, {})[size] = count / players
+    identities = {}
+    for (side, count), players_ in sorted(totals['identities'].items()):
+        identities.setdefault(side, {})[count] = players_ / players
+    seat_identities = {}
+    for (seat, side), count in sorted(totals['seat_identities'].items()):
+        seat_identities.setdefault(side, []).append(count / num_drafts)
+    factions = {}
+    for side in ('corp', 'runner'):
+        dealt = {faction: count for (side_, faction), count
+                 in totals['dealt_factions'].items() if side_ == side}
+        dealt_total = sum(dealt.values())
+        pool = Counter(card.faction_code for card in cards.ALL_CARDS
+                       if card.side_code == side)
+        pool_total = sum(pool.values())
+        factions[side] = {
+            faction: {
+                'dealt': dealt.get(faction, 0) / dealt_total,
+                'pool': pool[faction] / pool_total
+            }
+            for faction in sorted(pool)
+        }
+    main_faction = {
+        side: (totals['main_faction'][side]
+               / totals['main_faction'][side, 'picks'])
+        for side in ('corp', 'runner')
+    }
+    return {
+        'drafts': num_drafts,
+        'players': num_players,
+        'seconds': seconds,
+        'drafts_per_second': num_drafts / seconds,
+        'picks_per_second': totals['picks']['total'] / seconds,
+        'pack_sizes': pack_sizes,
+        'identities': identities,
+        'seat_identities': seat_identities,
+        'factions': factions,
+        'main_faction_share': main_faction
+    }
+
+
+def print_report(results):
+    print('{drafts} drafts of {players} in {seconds:.2f}s: '
+          '{drafts_per_second:.1f} drafts/s, '
+          '{picks_per_second:.0f} picks/s'.format(**results))
+    print('cards per pack (share of packs per player):')
+    for pool, sizes in results['pack_sizes'].items():
+        print('  {:<14}'.format(pool) + '  '.join(
+            '{size}: {share:.2f}'.format(size=size, share=share)
+            for size, share in sorted(sizes.items())))
+    print('identities picked per player (share of players):')
+    for side, counts in results['identities'].items():
+        print('  {:<14}'.format(side) + '  '.join(
+            '{count}: {share:.1%}'.format(count=count, share=share)
+            for count, share in sorted(counts.items())))
+    print('mean identities by seat:')
+    for side, seats in results['seat_identities'].items():
+        print('  {:<14}'.format(side) + ' '.join(
+            '{:.2f}'.format(mean) for mean in seats))
+    print('faction share of dealt cards (pool share):')
+    for side, factions in results['factions'].items():
+        for faction, share in factions.items():
+            print('  {:<7}{:<20}{:>7.1%} ({:.1%})'.format(
+                side, faction, share['dealt'], share['pool']))
+    print('picks from each player\'s main faction: ' + ', '.join(
+        '{side} {share:.1%}'.format(side=side, share=share)
+        for side, share in results['main_faction_share'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--drafts', type=int, default=1000)
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--bot', choices=sorted(BOTS), default='random')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first draft')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes to play drafts in')
+    parser.add_argument('--batch', type=int, default=50,
+                        help='drafts handed to a process at a time')
+    parser.add_argument('--alternate-passing', action='store_true',
+                        help='pass right in even rounds')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write the results to PATH')
+    args = parser.parse_args()
+
+    totals, seconds = run(args.drafts, args.players, args.bot, args.seed,
+                          args.workers, args.batch, args.alternate_passing)
+    results = report(totals, args.drafts, args.players, seconds)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
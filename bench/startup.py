@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Measures how long the app takes to start: the time to import it, split
+by what it imports, then the time until it is listening and the latency
+of its first requests.
+
+    python bench/startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+from fake_slack import FakeSlack
+from loadtest import APP_DIR, VERIFICATION_TOKEN, signed, start_app
+
+
+APP_ENV = {
+    'on_heroku': '1',
+    'api_token': 'xoxb-startup',
+    'verification_token': VERIFICATION_TOKEN,
+    'sentry_dsn': ''
+}
+
+
+def import_breakdown(extra_env):
+    """
+    Imports the app in a fresh interpreter with -X importtime and returns
+    the cumulative seconds for each module it imports directly, plus the
+    app module's own body as '(module body)' and the total as 'total'.
+    """
+    env = dict(os.environ, **APP_ENV)
+    env.update(extra_env)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import anrdraft'],
+        cwd=APP_DIR, env=env, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        head, cumulative_us, name = line.split('|')
+        self_us = head.split(':')[1].strip()
+        if not self_us.isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 1:
+            times[name] = times.get(name, 0) + int(cumulative_us) / 1e6
+        elif depth == 0 and name == 'anrdraft':
+            times['(module body)'] = int(self_us) / 1e6
+            times['total'] = int(cumulative_us) / 1e6
+    return times
+
+
+def first_requests(extra_env):
+    """
+    Starts the app and returns the seconds until it was listening and
+    the latency of its first two requests.
+    """
+    slack = FakeSlack().start()
+    started = time.perf_counter()
+    process, url = start_app(slack, extra_env)
+    timings = {'boot': time.perf_counter() - started}
+    try:
+        session = requests.Session()
+        for name, user in (('first_request', 'a'), ('second_request', 'b')):
+            body, headers = signed({
+                'token': VERIFICATION_TOKEN,
+                'user_name': 'startup-' + user,
+                'user_id': 'U' + user,
+                'text': ''
+            })
+            start = time.perf_counter()
+            session.post(url + '/draft-create', data=body, headers=headers,
+                         timeout=30).raise_for_status()
+            timings[name] = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+        slack.stop()
+    return timings
+
+
+def median_of(samples):
+    names = []
+    for sample in samples:
+        names.extend(name for name in sample if name not in names)
+    return {name: statistics.median(sample.get(name, 0.0)
+                                    for sample in samples)
+            for name in names}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help='imports to list, slowest first')
+    parser.add_argument('--env', action='append', default=[],
+                        metavar='NAME=VALUE',
+                        help='extra app setting, e.g. state_store=sqlite')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write the results to PATH')
+    args = parser.parse_args()
+    extra_env = dict(setting.split('=', 1) for setting in args.env)
+
+    imports = median_of(
+        [import_breakdown(extra_env) for _ in range(args.runs)])
+    requests_ = median_of(
+        [first_requests(extra_env) for _ in range(args.runs)])
+
+    print('import anrdraft: {:.1f} ms (median of {} runs)'.format(
+        imports.pop('total', 0.0) * 1000, args.runs))
+    ranked = sorted(imports.items(), key=lambda item: -item[1])
+    for name, seconds in ranked[:args.top]:
+        print('  {:<24}{:>8.1f} ms'.format(name, seconds * 1000))
+    print('listening after:        {:>8.1f} ms'.format(
+        requests_['boot'] * 1000))
+    print('first request:          {:>8.1f} ms'.format(
+        requests_['first_request'] * 1000))
+    print('second request:         {:>8.1f} ms'.format(
+        requests_['second_request'] * 1000))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'imports': imports, 'requests': requests_}, f,
+                      indent=4, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings. The app is imported once in the master and forked
+into the workers, so the card catalog and rendered card blocks are
+built once and shared copy-on-write.
+"""
+
+import gc
+
+
+pythonpath = 'anrdraft'
+preload_app = True
+
+
+def when_ready(server):
+    import render
+    render.warm()
+    # Move everything built so far out of the collector's reach, so
+    # collections in the workers don't touch, and so copy, the shared
+    # pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import anrdraft
+    anrdraft.start_worker()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'anrdraft')
+
+os.environ.update({
+    'on_heroku': '1',
+    'api_token': 'xoxb-test',
+    'verification_token': 'test-token',
+    'sentry_dsn': ''
+})
+sys.path.insert(0, APP_DIR)
+
+
+class FakeDispatcher:
+    """
+    Keeps the messages the app would have sent instead of calling Slack.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def post_messages(self, messages):
+        self.messages.extend(messages)
+
+    def call(self, method, batch=None, **kwargs):
+        self.messages.append(dict(kwargs, method=method))
+
+
+class FakeDms:
+
+    def cached(self, user_id):
+        return 'D' + user_id
+
+    def resolve(self, user_id):
+        return 'D' + user_id
+
+    def warm(self, user_id):
+        pass
+
+
+@pytest.fixture
+def app(monkeypatch):
+    import anrdraft
+    monkeypatch.setattr(anrdraft, 'DISPATCHER', FakeDispatcher())
+    monkeypatch.setattr(anrdraft, 'DMS', FakeDms())
+    yield anrdraft
+    for table in anrdraft.TABLES.values():
+        table.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
@@ -0,0 +1,13 @@
+import pytest
+
+import cards
+
+
+def test_get_card_finds_every_code():
+    for card in cards.ALL_CARDS:
+        assert cards.get_card(card.code) is card
+
+
+def test_get_card_unknown_code():
+    with pytest.raises(KeyError):
+        cards.get_card('99999')
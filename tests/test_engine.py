@@ -0,0 +1,31 @@
+import engine
+
+
+def seated_draft(alternate_passing):
+    draft = engine.new_draft('a', alternate_passing=alternate_passing)
+    for player in ('a', 'b', 'c'):
+        draft['players'][player] = engine.new_player()
+    engine.deal(draft, seed=1)
+    engine.assign_seats(draft, seats=['a', 'b', 'c'])
+    return draft
+
+
+def passed_to(draft, stage):
+    draft['metadata']['stage'] = stage
+    engine.pass_pack(draft, 'a', [0])
+    for player, player_info in draft['players'].items():
+        if player_info['inbox']:
+            player_info['inbox'].clear()
+            return player
+
+
+def test_packs_always_pass_left_by_default():
+    draft = seated_draft(alternate_passing=False)
+    assert passed_to(draft, 1) == 'b'
+    assert passed_to(draft, 2) == 'b'
+
+
+def test_alternate_passing_goes_right_in_even_rounds():
+    draft = seated_draft(alternate_passing=True)
+    assert passed_to(draft, 1) == 'b'
+    assert passed_to(draft, 2) == 'c'
@@ -0,0 +1,102 @@
+"""
+Drives drafts through the slash commands and picks, checking after each
+step that CREATORS and PLAYERS still agree with DRAFTS.
+"""
+
+TOKEN = 'test-token'
+
+
+def command(client, endpoint, user, text=''):
+    response = client.post(endpoint, data={
+        'token': TOKEN,
+        'user_name': user,
+        'user_id': 'U' + user,
+        'text': text
+    })
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def create(client, user):
+    return command(client, '/draft-create', user).split('`')[1]
+
+
+def play_out(app, draft_id):
+    while draft_id in app.DRAFTS:
+        for player in list(app.get_players(draft_id)):
+            info = app.DRAFTS[draft_id]['players'][player]
+            if not info['has_open_pack']:
+                continue
+            value = app.tokens.encode(
+                draft_id, player, info['generation'], 0)
+            picked = app.handle_pick([{'value': value}])
+            app.open_next_pack_or_wait(*picked)
+            assert app.check_indexes() == []
+            if draft_id not in app.DRAFTS:
+                break
+
+
+def test_create_and_join(app, client):
+    draft_id = create(client, 'alice')
+    command(client, '/draft-join', 'bob', draft_id)
+    command(client, '/draft-join', 'carol', '`{}`'.format(draft_id))
+    assert set(app.get_players(draft_id)) == {'alice', 'bob', 'carol'}
+    assert app.check_indexes() == []
+
+
+def test_leave(app, client):
+    draft_id = create(client, 'alice')
+    command(client, '/draft-join', 'bob', draft_id)
+    command(client, '/draft-leave', 'bob', draft_id)
+    assert 'bob' not in app.PLAYERS
+    assert app.check_indexes() == []
+
+
+def test_creator_leaving_cancels(app, client):
+    draft_id = create(client, 'alice')
+    command(client, '/draft-join', 'bob', draft_id)
+    command(client, '/draft-leave', 'alice', draft_id)
+    assert draft_id not in app.DRAFTS
+    assert app.check_indexes() == []
+    assert not app.PLAYERS and not app.CREATORS
+
+
+def test_cancel(app, client):
+    draft_id = create(client, 'alice')
+    command(client, '/draft-join', 'bob', draft_id)
+    command(client, '/draft-cancel', 'alice', draft_id)
+    assert draft_id not in app.DRAFTS
+    assert app.check_indexes() == []
+    assert not app.PLAYERS and not app.CREATORS
+
+
+def test_complete(app, client):
+    draft_id = create(client, 'alice')
+    command(client, '/draft-join', 'bob', draft_id)
+    command(client, '/draft-join', 'carol', draft_id)
+    command(client, '/draft-start', 'alice', draft_id)
+    assert app.check_indexes() == []
+    play_out(app, draft_id)
+    assert draft_id not in app.DRAFTS
+    assert app.check_indexes() == []
+    assert not app.PLAYERS and not app.CREATORS
+
+
+def test_drafts_are_independent(app, client):
+    first = create(client, 'alice')
+    second = create(client, 'dave')
+    command(client, '/draft-join', 'bob', first)
+    command(client, '/draft-join', 'erin', second)
+    command(client, '/draft-start', 'alice', first)
+    command(client, '/draft-cancel', 'dave', second)
+    play_out(app, first)
+    assert app.check_indexes() == []
+    assert not app.DRAFTS
+
+
+def test_mismatch_is_reported(app, client):
+    draft_id = create(client, 'alice')
+    app.PLAYERS['bob'] = {'player_id': 'Ubob', 'draft_id': draft_id,
+                          'dm_id': None}
+    assert app.check_indexes() == [
+        'player bob points at {draft}'.format(draft=draft_id)]
@@ -0,0 +1,91 @@
+"""
+Crashes the app while it snapshots the journal and checks that a draft
+recovered from what was left on disk can still be played to the end.
+"""
+
+import json
+import os
+
+import pytest
+
+import journal
+import store
+from test_indexes import command, create
+
+
+class Crash(Exception):
+    pass
+
+
+class InlineQueue:
+    """
+    Runs queued work straight away, so the packs re-sent after recovery
+    don't race the rest of the test.
+    """
+
+    def submit(self, key, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+def pick(app, draft_id, player):
+    info = app.DRAFTS[draft_id]['players'][player]
+    value = app.tokens.encode(draft_id, player, info['generation'], 0)
+    app.process_pick({'actions': [{'value': value}]})
+
+
+def open_packs(app, draft_id):
+    return [player for player in app.get_players(draft_id)
+            if app.DRAFTS[draft_id]['players'][player]['has_open_pack']]
+
+
+def dump(app):
+    return json.dumps(app.snapshot_state(), sort_keys=True,
+                      default=store.json_default)
+
+
+def cards_left(app, draft_id):
+    return sum(len(pack) for info in app.DRAFTS[draft_id]['players'].values()
+               for pack in info['packs'] + info['inbox'])
+
+
+@pytest.fixture
+def journaled(app, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'PICK_QUEUE', InlineQueue())
+    monkeypatch.setattr(app, 'JOURNAL', journal.Journal(
+        str(tmp_path / 'journal')))
+    return app
+
+
+@pytest.mark.parametrize('crash_on', ['sixth', 'last'])
+def test_recover_after_crash_mid_snapshot(journaled, client, monkeypatch,
+                                          crash_on):
+    app = journaled
+    draft_id = create(client, 'alice')
+    command(client, '/draft-join', 'bob', draft_id)
+    command(client, '/draft-join', 'carol', draft_id)
+    command(client, '/draft-start', 'alice', draft_id)
+    picks = 6 if crash_on == 'sixth' else cards_left(app, draft_id)
+    # Four events so far, so the snapshot is due on that pick.
+    app.JOURNAL.snapshot_every = 4 + picks
+
+    def crash(fd, length):
+        raise Crash()
+
+    with monkeypatch.context() as m:
+        # The new snapshot is in place but the log is never emptied.
+        m.setattr(os, 'ftruncate', crash)
+        with pytest.raises(Crash):
+            for _ in range(picks):
+                pick(app, draft_id, open_packs(app, draft_id)[0])
+    before = dump(app)
+
+    for table in app.TABLES.values():
+        table.clear()
+    app.recover()
+    assert dump(app) == before
+    assert app.check_indexes() == []
+
+    while draft_id in app.DRAFTS:
+        pick(app, draft_id, open_packs(app, draft_id)[0])
+    assert app.check_indexes() == []
+    assert not app.PLAYERS and not app.CREATORS